@@ -0,0 +1,246 @@
+"""
+Anytime mode: results are kept on disk while the solver runs.
+
+The best submission so far is written (atomically) whenever it improves,
+and the genetic algorithm's population is checkpointed, so that a later
+run can resume from it instead of running all greedy heuristics again.
+
+Population file layout (little-endian):
+    header (HEADER_SIZE bytes): magic, version, fingerprint of the instance,
+                                P, L, K (book orders of all candidates),
+                                R (distinct book orders), E (their books)
+    libraries    int32[P*L]   library order of every candidate
+    counts       int32[P]     number of book orders of every candidate
+    row_ids      int32[K]     index of every candidate's book order in rows
+    row_libs     int32[R]     library of every distinct book order
+    offsets      int64[R+1]   CSR offsets into `books`
+    books        int32[E]
+Only the books scanned by libraries which sign up in time are stored,
+each distinct (library, books) row once; candidates in the population
+more than once are stored once.
+When loading, the other books of those libraries follow in descending
+score order, other libraries keep their order from the input.
+"""
+import hashlib
+import math
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from loader import Problem
+from strategies.strategies import BookOrders, SimpleCandidate
+from submission import Submission
+
+MAGIC = b'HC20POPL'
+VERSION = 2
+HEADER_FORMAT = '<8sI32s5q'
+HEADER_SIZE = 128
+
+
+def instance_fingerprint(instance: Problem) -> bytes:
+    """SHA-256 of the instance arrays"""
+    h = hashlib.sha256()
+    h.update(struct.pack('<3q', instance.B, instance.L, instance.D))
+    for arr in (instance.book_scores, instance.signup_time,
+                instance.efficiency, instance.lib_offsets, instance.lib_books):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    return h.digest()
+
+
+def write_atomic(path: 'str | Path', data: 'Submission | SimpleCandidate'):
+    """Write a submission so that readers never see a partial file"""
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        data.write(file=f)
+    os.replace(tmp, path)
+
+
+def read_submission(path: 'str | Path',
+                    instance: Problem) -> Optional[Submission]:
+    """A submission written by `write_atomic`, None if there is none"""
+    try:
+        tokens = np.fromstring(Path(path).read_bytes(), dtype=np.int64,
+                               sep=' ')
+    except FileNotFoundError:
+        return None
+    if len(tokens) == 0:
+        return None
+    libraries, books = [], []
+    pos = 1
+    for _ in range(int(tokens[0])):
+        Y, k = tokens[pos:pos + 2].tolist()
+        libraries.append(Y)
+        books.append(tokens[pos + 2:pos + 2 + k])
+        pos += 2 + k
+    return Submission(instance, libraries, books)
+
+
+def save_population(path: 'str | Path', instance: Problem,
+                    population: list[SimpleCandidate],
+                    fingerprint: Optional[bytes] = None):
+    """
+    Store library orders and scanned books of `population` (atomically).
+
+    `fingerprint` is `instance_fingerprint(instance)`, computed
+    if not given.
+    """
+    if fingerprint is None:
+        fingerprint = instance_fingerprint(instance)
+    L = instance.L
+    # elites and selected candidates appear many times
+    population = list({id(c): c for c in population}.values())
+    libraries = np.empty((len(population), L), dtype=np.int32)
+    counts = np.empty(len(population), dtype=np.int32)
+    row_ids = []
+    # (library, scanned books) -> index; candidates share most rows
+    rows: dict[tuple[int, tuple[int, ...]], int] = {}
+    for p, candidate in enumerate(population):
+        libraries[p] = candidate.libraries
+        libs, capacity = instance.scorer.schedule(candidate.libraries)
+        counts[p] = len(libs)
+        for Y, c in zip(libs.tolist(), capacity.tolist()):
+            key = (Y, tuple(candidate.books_in_library[Y][:c]))
+            row_ids.append(rows.setdefault(key, len(rows)))
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(x) for _, x in rows], out=offsets[1:])
+    books = np.fromiter((b for _, x in rows for b in x), dtype=np.int32,
+                        count=int(offsets[-1]))
+    row_libs = np.fromiter((Y for Y, _ in rows), dtype=np.int32,
+                           count=len(rows))
+
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+                             fingerprint,
+                             len(population), L, len(row_ids), len(rows),
+                             len(books))
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for arr, dtype in ((libraries, '<i4'), (counts, '<i4'),
+                           (np.asarray(row_ids), '<i4'), (row_libs, '<i4'),
+                           (offsets, '<i8'), (books, '<i4')):
+            f.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+    os.replace(tmp, path)
+
+
+def load_population(path: 'str | Path', instance: Problem,
+                    fingerprint: Optional[bytes] = None
+                    ) -> Optional[list[SimpleCandidate]]:
+    """
+    Candidates stored by `save_population`, None when the file
+    is missing or belongs to a different instance.
+    """
+    if fingerprint is None:
+        fingerprint = instance_fingerprint(instance)
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, stored_fingerprint, P, L, K, R, E = struct.unpack_from(
+        HEADER_FORMAT, data)
+    if (magic, version) != (MAGIC, VERSION) or L != instance.L \
+            or stored_fingerprint != fingerprint:
+        print(f'{path}: not a checkpoint of this instance', file=sys.stderr)
+        return None
+
+    offset = HEADER_SIZE
+    arrays = []
+    for dtype, n in (('<i4', P * L), ('<i4', P), ('<i4', K), ('<i4', R),
+                     ('<i8', R + 1), ('<i4', E)):
+        arrays.append(np.frombuffer(data, dtype=dtype, count=n,
+                                    offset=offset))
+        offset += arrays[-1].nbytes
+    libraries, counts, row_ids, row_libs, offsets, books = arrays
+    libraries = libraries.reshape(P, L)
+
+    # scanned books, then the other books of the library by score
+    lib_offsets, by_score = instance.lib_offsets, instance.books_by_score
+    rows = []
+    for r, Y in enumerate(row_libs.tolist()):
+        scanned = books[offsets[r]:offsets[r + 1]]
+        rest = by_score[lib_offsets[Y]:lib_offsets[Y + 1]]
+        rest = rest[~np.isin(rest, scanned)]
+        rows.append(scanned.tolist() + rest.tolist())
+
+    population = []
+    k = 0
+    for p in range(P):
+        ids = row_ids[k:k + counts[p]].tolist()
+        k += counts[p]
+        population.append(SimpleCandidate.new_without_copy(
+            instance,
+            libraries[p].tolist(),
+            BookOrders(instance.library_book_ids,
+                       {int(row_libs[r]): rows[r] for r in ids})))
+    return population
+
+
+class Anytime:
+    """
+    Best-so-far submission in `output`
+    and the genetic population in `output` + '.pop'.
+    """
+
+    def __init__(self, instance: Problem, output: 'str | Path',
+                 checkpoint_interval: int = 1, min_seconds: float = 2.0):
+        self.instance = instance
+        self.output = Path(output)
+        self.population_file = self.output.with_name(self.output.name + '.pop')
+        self.fingerprint = instance_fingerprint(instance)
+        # checkpoint the population every this many generations,
+        # but not more often than every `min_seconds` (wall time)
+        self.checkpoint_interval = checkpoint_interval
+        self.min_seconds = min_seconds
+        self._last_checkpoint = -math.inf
+        self._last_generation: Optional[int] = None
+        self.best_score = -1
+
+    def offer(self, score: int, candidate: 'Submission | SimpleCandidate') -> bool:
+        """Write `candidate` if it is better than the best so far"""
+        if score <= self.best_score:
+            return False
+        self.best_score = score
+        write_atomic(self.output, candidate)
+        print(f'anytime: {score:_} written to {self.output}', file=sys.stderr)
+        return True
+
+    def checkpoint(self, generation: int, population: list[SimpleCandidate],
+                   force: bool = False):
+        """
+        Save the population (throttled), with `force` unless
+        this generation is saved already (the end of a run).
+        """
+        now = time.perf_counter()
+        if force:
+            if generation == self._last_generation:
+                return
+        elif generation % self.checkpoint_interval != 0 \
+                or now - self._last_checkpoint < self.min_seconds:
+            return
+        save_population(self.population_file, self.instance, population,
+                        self.fingerprint)
+        self._last_checkpoint = now
+        self._last_generation = generation
+
+    def resume(self) -> Optional[list[SimpleCandidate]]:
+        """The last checkpointed population, if any"""
+        population = load_population(self.population_file, self.instance,
+                                     self.fingerprint)
+        if population is not None:
+            print(f'anytime: resuming from {self.population_file} '
+                  f'({len(population)} candidates)', file=sys.stderr)
+            # the output may be newer than the last checkpoint
+            written = read_submission(self.output, self.instance)
+            if written is not None:
+                self.best_score = written.get_submission_score()
+                print(f'anytime: {self.output} scores {self.best_score:_}',
+                      file=sys.stderr)
+        return population
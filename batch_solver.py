@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Solve many instances at once, one process per instance.
+
+    $ python3 ./batch_solver.py -j 4 --budget 120 input/*.txt
+
+Submissions are written to `out-<name>.txt` (in `--out`),
+the solver's stderr to `out-<name>.log`.
+Every instance gets its own CPU time budget (`our_timer`).
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+
+import instance_cache
+import main_solver
+import our_timer
+
+
+def solve_file(filename: str, out_dir: str, budget: float,
+               only_greedy: bool) -> dict:
+    """
+    Solve one instance in a worker, return a row of the summary.
+
+    Exceptions are logged, the row then has `failed` set.
+    """
+    wall = time.perf_counter()
+    name = Path(filename).stem
+    out = Path(out_dir) / f'out-{name}.txt'
+    row = dict(name=name, score=0, upper_bound=0, failed=False)
+    # file descriptor 2, so that `from sys import stderr` is redirected too
+    with open(out.with_suffix('.log'), 'w') as log:
+        sys.stderr.flush()
+        os.dup2(log.fileno(), 2)
+
+        our_timer.reset_countdown_timer()
+        our_timer.set_budget(budget)
+        try:
+            instance = instance_cache.read_input_file(filename)
+            sub = main_solver.solve_for_this_instance(instance,
+                                                      only_greedy=only_greedy)
+            with open(out, 'w') as f:
+                sub.write(file=f)
+            row['score'] = sub.get_submission_score()
+            row['upper_bound'] = instance.upper_bound
+            print(f"score {row['score']}", file=sys.stderr)
+        except Exception:
+            traceback.print_exc()
+            row['failed'] = True
+        sys.stderr.flush()
+
+    row['cpu'] = our_timer.get_cpu_time_ns() * 1e-9
+    row['wall'] = time.perf_counter() - wall
+    return row
+
+
+def _solve_star(args: tuple) -> dict:
+    return solve_file(*args)
+
+
+def solve_all(files: list[str], out_dir: str = '.', jobs: int = 0,
+              budget: float = 300, only_greedy: bool = False) -> list[dict]:
+    """
+    Solve `files` in a pool of `jobs` processes (all cores by default).
+
+    Every instance runs in a fresh process (`maxtasksperchild=1`),
+    so no timer or cache state is shared between them.
+    The genetic algorithm runs without its own worker pool
+    (pool processes cannot have children).
+    """
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    tasks = [(fn, out_dir, budget, only_greedy) for fn in files]
+    if 'fork' in mp.get_all_start_methods():
+        ctx = mp.get_context('fork')
+    else:
+        ctx = mp.get_context()
+    rows = []
+    with ctx.Pool(min(jobs, len(tasks)) or 1, maxtasksperchild=1) as pool:
+        for row in pool.imap_unordered(_solve_star, tasks):
+            if row['failed']:
+                print(f"{row['name']}: FAILED (see its log)", file=sys.stderr)
+            else:
+                print(f"{row['name']}: {row['score']:_}", file=sys.stderr)
+            rows.append(row)
+    rows.sort(key=lambda x: x['name'])
+    return rows
+
+
+def print_summary(rows: list[dict], wall: float, file=sys.stdout):
+    print(f"{'instance':<32} {'score':>14} {'% of UB':>8} {'CPU s':>8}",
+          file=file)
+    for r in rows:
+        if r['failed']:
+            print(f"{r['name']:<32} {'FAILED':>14} {'':>8} {r['cpu']:>8.1f}",
+                  file=file)
+            continue
+        pct = 100 * r['score'] / r['upper_bound'] if r['upper_bound'] else 100
+        print(f"{r['name']:<32} {r['score']:>14_} {pct:>8.2f} {r['cpu']:>8.1f}",
+              file=file)
+    total = sum(r['score'] for r in rows)
+    cpu = sum(r['cpu'] for r in rows)
+    print(f"{'total':<32} {total:>14_} {'':>8} {cpu:>8.1f}", file=file)
+    failed = sum(r['failed'] for r in rows)
+    if failed:
+        print(f'{failed} of {len(rows)} instances FAILED', file=file)
+    print(f'wall time {wall:.1f} s', file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('files', nargs='*', help='input files (input/*.txt)')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='number of processes (default: all cores)')
+    parser.add_argument('--budget', type=float, default=300,
+                        help='CPU seconds per instance (default: 300)')
+    parser.add_argument('--out', default='.',
+                        help='directory for submissions and logs')
+    parser.add_argument('--only-greedy', action='store_true')
+    args = parser.parse_args()
+
+    files = args.files or sorted(str(x) for x in Path('input').glob('*.txt'))
+    start = time.perf_counter()
+    rows = solve_all(files, args.out, args.jobs, args.budget,
+                     args.only_greedy)
+    print_summary(rows, time.perf_counter() - start)
+    if any(r['failed'] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
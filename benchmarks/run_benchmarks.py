@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmarks on generated instances (configs in `benchmarks/configs/`).
+
+    $ python3 benchmarks/run_benchmarks.py                  # all configs
+    $ python3 benchmarks/run_benchmarks.py small medium
+    $ python3 benchmarks/run_benchmarks.py --save-baseline  # after a good run
+
+Instances are generated once per config (`instance_generator.py`,
+fixed seeds) into `benchmarks/instances/`, the file name contains a hash
+of the config. A config may name the `shape` its instance must have.
+Every instance is measured in its own
+process, so peak RSS belongs to that instance only.
+Results are written to `benchmarks/results.json` and compared with
+`benchmarks/baseline.json`; the exit code is 1 when a metric got worse
+by more than `--tolerance`.
+"""
+import argparse
+import hashlib
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib  # type: ignore
+
+BENCH_DIR = ROOT / 'benchmarks'
+CONFIGS = BENCH_DIR / 'configs'
+RESULTS = BENCH_DIR / 'results.json'
+BASELINE = BENCH_DIR / 'baseline.json'
+
+# metrics where a higher value is better, all others are costs
+HIGHER_IS_BETTER = {'score_per_s', 'ga_generations_per_s'}
+
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    out = f(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def generate(config: Path) -> Path:
+    import instance_generator
+    import loader
+    with open(config, 'rb') as f:
+        params = tomllib.load(f)
+    # a changed config (also its `shape`) gives a new instance
+    digest = hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    shape = params.pop('shape', None)
+    filename = ROOT / params['filename']
+    filename = filename.with_name(f'{filename.stem}-{digest}{filename.suffix}')
+    if not filename.exists():
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        params['filename'] = str(filename)
+        instance_generator.main(**params)
+        if shape is not None:
+            # checked once, the file name changes with the config
+            actual = loader.read_input_file(str(filename)).shape
+            if actual != shape:
+                filename.unlink()
+                raise ValueError(f'{config.name}: shape {actual!r}, '
+                                 f'expected {shape!r}')
+    return filename
+
+
+def measure(filename: Path, generations: int) -> dict:
+    """All metrics of one instance (run in a separate process)"""
+    import loader
+    import strategies.greedy as greedy
+    from strategies.genetic import Genetic
+
+    m: dict = {}
+    instance, m['load_s'] = timed(loader.read_input_file, str(filename))
+
+    candidates = []
+    out, m['greedy_sorters_s'] = timed(
+        greedy.run_sorters, instance, greedy.ALL_LIBR_BOOK_PAIRS)
+    candidates.extend(out)
+    # every pair on its own, nothing shared
+    for sorter in greedy.ALL_LIBR_BOOK_PAIRS:
+        name = sorter.get_strategy_name().strip('()').replace(' and ', '+')
+        _, m[f'{name}_s'] = timed(greedy.run_sorters, instance, [sorter])
+    for strategy in (greedy.GreedyDynamicLazy, greedy.GreedyChooseLibraryLazy):
+        out, m[f'{strategy.__name__}_s'] = timed(strategy(instance))
+        if out is not None:
+            candidates.append(out)
+    out, m['GreedyFast.sweep_s'] = timed(greedy.GreedyFast(instance).sweep)
+    candidates.append(out[0][2])
+    _, m['books_improver_s'] = timed(candidates[-1].books_improver)
+
+    # scoring throughput (full scoring of one candidate)
+    best = candidates[-1]
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < 1.0:
+        instance.scorer.score_candidate(best.libraries, best.books_in_library)
+        calls += 1
+    m['score_per_s'] = calls / (time.perf_counter() - start)
+
+    ga = Genetic(instance, max_generations=generations, seed=0)
+    ga.sub_to_cand(candidates)
+    population = ga.initial_population()
+    _, ga_s = timed(ga.evolve, population)
+    m['ga_generations_per_s'] = generations / ga_s
+
+    m['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return m
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Descriptions of metrics which are worse than in the baseline"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old:
+                continue
+            change = value / old - 1
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            # very short phases are too noisy to compare
+            if metric.endswith('_s') and max(value, old) < 0.05:
+                continue
+            if change > tolerance:
+                regressions.append(f'{name}.{metric}: {old:.4g} -> {value:.4g} '
+                                   f'({100 * change:+.0f} %)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('configs', nargs='*',
+                        help='config names (default: all in benchmarks/configs)')
+    parser.add_argument('--generations', type=int, default=5,
+                        help='GA generations to measure (default: 5)')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative slowdown (default: 0.2)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--single', metavar='INSTANCE',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # child process: print the metrics of one instance
+        json.dump(measure(Path(args.single), args.generations), sys.stdout)
+        return
+
+    names = args.configs or sorted(x.stem for x in CONFIGS.glob('*.toml'))
+    results = {}
+    for name in names:
+        filename = generate(CONFIGS / f'{name}.toml')
+        print(f'{name}: measuring', file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, __file__, '--single', str(filename),
+             '--generations', str(args.generations)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        results[name] = json.loads(proc.stdout)
+        for metric, value in results[name].items():
+            print(f'  {metric:<52} {value:12.4f}', file=sys.stderr)
+
+    RESULTS.write_text(json.dumps(results, indent=1))
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(results, indent=1))
+        print(f'baseline saved to {BASELINE}', file=sys.stderr)
+        return
+    if not BASELINE.exists():
+        print('no baseline to compare with (--save-baseline)', file=sys.stderr)
+        return
+    regressions = compare(results, json.loads(BASELINE.read_text()),
+                          args.tolerance)
+    for r in regressions:
+        print(f'REGRESSION {r}', file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+    print('no regressions', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
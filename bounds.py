@@ -0,0 +1,142 @@
+"""
+Upper bounds on the score of an instance.
+
+Every bound is a relaxation, so a solution reaching one of them
+is optimal, and `score / bound` is a lower bound of the relative quality.
+
+    book_bound      books which are in some library
+    knapsack_bound  every library scans its best `min(N_j, (D - T_j) * M_j)`
+                    books (ignores duplicates), libraries must sign up
+                    before the deadline: fractional knapsack with weights T_j
+    lp_bound        LP relaxation of the whole problem (needs SciPy,
+                    only for small instances)
+"""
+import math
+import sys
+from typing import Optional
+
+import numpy as np
+
+from loader import Problem
+
+try:
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix, vstack
+except ImportError:
+    linprog = None
+
+# the LP relaxation is skipped for instances with more book entries
+LP_MAX_ENTRIES = 60_000
+# and given up after this many seconds
+LP_TIME_LIMIT = 10.0
+
+
+def book_bound(instance: Problem) -> int:
+    """Sum of scores of books which some library has"""
+    return int(instance.book_scores[instance.book_frequency > 0].sum())
+
+
+def library_values(instance: Problem) -> np.ndarray:
+    """Score of the books library j could scan when signing up first"""
+    return instance.best_books_score(instance.initial_capacity)
+
+
+def knapsack_bound(instance: Problem) -> int:
+    """
+    Fractional knapsack: libraries which sign up in time take
+    at most D - 1 days together (the last one has to finish before D).
+    """
+    values = library_values(instance)
+    weights = instance.signup_time
+    useful = values > 0
+    values, weights = values[useful], weights[useful]
+    with np.errstate(divide='ignore'):
+        density = values / weights
+    order = np.argsort(-density, kind='stable')
+    values, weights = values[order], weights[order]
+
+    days = instance.D - 1
+    used = np.cumsum(weights)
+    whole = int(np.searchsorted(used, days, side='right'))
+    bound = int(values[:whole].sum())
+    if whole < len(values):
+        left = days - (int(used[whole - 1]) if whole > 0 else 0)
+        bound += int(values[whole]) * left // int(weights[whole])
+    return bound
+
+
+def lp_bound(instance: Problem,
+             max_entries: int = LP_MAX_ENTRIES) -> Optional[int]:
+    """
+    LP relaxation, None without SciPy or for large instances.
+
+    Variables: x_j (library j signs up) and y_e (entry e = book b
+    of library j is scanned by j), all in [0, 1].
+        sum T_j x_j <= D - 1
+        sum of y_e of library j <= (D - T_j) * M_j * x_j
+        y_e <= x_j
+        sum of y_e of book b <= 1
+    """
+    E = len(instance.lib_books)
+    if linprog is None or E > max_entries:
+        return None
+    L = instance.L
+    entries = np.arange(E)
+    library = instance.library_of_entry
+    ones = np.ones(E)
+
+    # columns: x_0 .. x_{L-1}, y_0 .. y_{E-1}
+    signup = coo_matrix((instance.signup_time.astype(float),
+                         (np.zeros(L, dtype=np.int64), np.arange(L))),
+                        shape=(1, L + E))
+    capacity = coo_matrix(
+        (np.concatenate([-instance.initial_capacity.astype(float), ones]),
+         (np.concatenate([np.arange(L), library]),
+          np.concatenate([np.arange(L), L + entries]))),
+        shape=(L, L + E))
+    linked = coo_matrix(
+        (np.concatenate([-ones, ones]),
+         (np.concatenate([entries, entries]),
+          np.concatenate([library, L + entries]))),
+        shape=(E, L + E))
+    unique = coo_matrix((ones, (instance.lib_books, L + entries)),
+                        shape=(instance.B, L + E))
+    A = vstack([signup, capacity, linked, unique]).tocsr()
+    b = np.concatenate([[instance.D - 1], np.zeros(L + E),
+                        np.ones(instance.B)])
+    c = np.concatenate([np.zeros(L),
+                        -instance.book_scores[instance.lib_books].astype(float)])
+
+    result = linprog(c, A_ub=A, b_ub=b, bounds=(0, 1), method='highs',
+                     options=dict(time_limit=LP_TIME_LIMIT))
+    if result.status != 0:
+        print(f'LP bound: {result.message}', file=sys.stderr)
+        return None
+    # scores are integers
+    return int(np.floor(-result.fun + 1e-6))
+
+
+def upper_bound(instance: Problem, lp: bool = True) -> int:
+    """The tightest of the bounds above"""
+    bound = min(book_bound(instance), knapsack_bound(instance))
+    if lp:
+        value = lp_bound(instance)
+        if value is not None:
+            bound = min(bound, value)
+    return bound
+
+
+def tighten(instance: Problem, lp: bool = True) -> int:
+    """Replace `instance.upper_bound` by `upper_bound` if it is lower"""
+    bound = upper_bound(instance, lp)
+    if bound < instance.upper_bound:
+        print(f'Tighter bound: {bound:_} '
+              f'({100 * bound / instance.upper_bound:.2f} % of the previous)',
+              file=sys.stderr)
+        instance.upper_bound = bound
+    return instance.upper_bound
+
+
+def target_score(instance: Problem, gap: float = 0.0) -> int:
+    """Score within `gap` (relative) of `instance.upper_bound`"""
+    return math.ceil((1 - gap) * instance.upper_bound)
@@ -0,0 +1,211 @@
+"""
+Binary instance cache.
+
+The text instance is parsed once and its arrays are stored
+next to it (`input/a_example.txt` -> `input/a_example.bin`).
+Later runs open the binary file with `np.memmap`, so loading is
+almost free and all solver processes on this host share the pages.
+
+File layout (little-endian):
+    header (HEADER_SIZE bytes): magic, version, SHA-256 of the text file,
+                                its size and mtime (ns), B, L, D,
+                                E (total number of book entries)
+    book_scores       int64[B]
+    signup_time       int64[L]
+    efficiency        int64[L]
+    lib_offsets       int64[L+1]
+    lib_books         int32[E]
+    book_lib_offsets  int64[B+1]
+    book_libs         int32[E]
+Every array starts at a multiple of ALIGNMENT bytes.
+
+The text file is hashed only when its size or mtime differ
+from the header (e.g. after copying it).
+"""
+import hashlib
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import loader
+from loader import Problem
+
+MAGIC = b'HC20INST'
+VERSION = 2
+HEADER_FORMAT = '<8sI32s6q'
+# size and mtime follow magic, version and digest
+STAMP_OFFSET = struct.calcsize('<8sI32s')
+HEADER_SIZE = 128
+ALIGNMENT = 64
+
+
+def _array_layout(B: int, L: int, E: int):
+    """(name, dtype, length) of arrays stored after the header"""
+    return [
+        ('book_scores', '<i8', B),
+        ('signup_time', '<i8', L),
+        ('efficiency', '<i8', L),
+        ('lib_offsets', '<i8', L + 1),
+        ('lib_books', '<i4', E),
+        ('book_lib_offsets', '<i8', B + 1),
+        ('book_libs', '<i4', E),
+    ]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def file_digest(filename: 'str | Path') -> bytes:
+    """SHA-256 of the file contents"""
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.digest()
+
+
+def file_stamp(filename: 'str | Path') -> tuple[int, int]:
+    """Size and mtime (ns) of the file"""
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def cache_path(filename: 'str | Path') -> Path:
+    return Path(filename).with_suffix('.bin')
+
+
+def write_cache(instance: Problem, path: 'str | Path', digest: bytes,
+                stamp: tuple[int, int] = (0, 0)):
+    """Store arrays of `instance` in the binary format (atomically)"""
+    E = len(instance.lib_books)
+    arrays = {
+        'book_scores': instance.book_scores,
+        'signup_time': instance.signup_time,
+        'efficiency': instance.efficiency,
+        'lib_offsets': instance.lib_offsets,
+        'lib_books': instance.lib_books,
+        'book_lib_offsets': instance.book_lib_offsets,
+        'book_libs': instance.book_libs,
+    }
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, digest, *stamp,
+                             instance.B, instance.L, instance.D, E)
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        offset = HEADER_SIZE
+        for name, dtype, length in _array_layout(instance.B, instance.L, E):
+            start = _aligned(offset)
+            f.write(b'\0' * (start - offset))
+            arr = np.ascontiguousarray(arrays[name], dtype=dtype)
+            assert len(arr) == length
+            f.write(arr.tobytes())
+            offset = start + arr.nbytes
+    # other processes never see a partially written file
+    os.replace(tmp, path)
+
+
+def read_header(path: 'str | Path') -> Optional[tuple[bytes, tuple[int, int]]]:
+    """Digest and stamp of the text file stored in the cache, or None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, digest, size, mtime, *_ = struct.unpack_from(
+        HEADER_FORMAT, data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return digest, (size, mtime)
+
+
+def update_stamp(path: 'str | Path', stamp: tuple[int, int]):
+    """Store a new stamp of the (unchanged) text file in the header"""
+    try:
+        with open(path, 'r+b') as f:
+            f.seek(STAMP_OFFSET)
+            f.write(struct.pack('<2q', *stamp))
+    except OSError:
+        pass
+
+
+def open_cache(path: 'str | Path',
+               digest: Optional[bytes] = None) -> Optional[Problem]:
+    """
+    Open the binary instance without copying its arrays.
+
+    Returns None if the file is missing, malformed
+    or was created from a different text file.
+    """
+    try:
+        buf = np.memmap(path, dtype=np.uint8, mode='r')
+    except (OSError, ValueError):
+        return None
+    if len(buf) < HEADER_SIZE:
+        return None
+    magic, version, stored_digest, _, _, B, L, D, E = struct.unpack_from(
+        HEADER_FORMAT, buf[:HEADER_SIZE].tobytes())
+    if magic != MAGIC or version != VERSION:
+        return None
+    if digest is not None and digest != stored_digest:
+        return None
+
+    arrays = {}
+    offset = HEADER_SIZE
+    for name, dtype, length in _array_layout(B, L, E):
+        start = _aligned(offset)
+        end = start + length * np.dtype(dtype).itemsize
+        if end > len(buf):
+            return None
+        arrays[name] = buf[start:end].view(dtype)
+        offset = end
+
+    return Problem.from_arrays(
+        B, L, D,
+        arrays['book_scores'],
+        arrays['signup_time'],
+        arrays['efficiency'],
+        arrays['lib_offsets'],
+        arrays['lib_books'],
+        arrays['book_lib_offsets'],
+        arrays['book_libs'],
+    )
+
+
+def read_input_file(filename: 'str | Path') -> Problem:
+    """
+    Load the instance from its binary cache,
+    (re)building the cache when the text file has changed.
+    """
+    path = cache_path(filename)
+    stamp = file_stamp(filename)
+    digest = None
+    header = read_header(path)
+    if header is not None and header[1] != stamp:
+        # touched or copied, maybe changed
+        digest = file_digest(filename)
+        if digest == header[0]:
+            update_stamp(path, stamp)
+        else:
+            header = None
+    if header is not None:
+        instance = open_cache(path, header[0])
+        if instance is not None:
+            print(f'Reading cached {path}', file=sys.stderr)
+            return instance
+
+    if digest is None:
+        digest = file_digest(filename)
+    instance = loader.read_input_file(str(filename))
+    try:
+        write_cache(instance, path, digest, stamp)
+    except OSError as e:
+        print(f'Cannot write instance cache {path}: {e}', file=sys.stderr)
+    return instance
@@ -1,17 +1,29 @@
 import sys
 import random
-import tomli
 
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib  # type: ignore
 
-def main(filename, B, L, D, score_d, score_u, signup_d, signup_u, eff_d, eff_u, bklib_d, bklib_u):
+
+def main(filename, B, L, D, score_d, score_u, signup_d, signup_u, eff_d, eff_u, bklib_d, bklib_u, seed=None, unique_books=False):
     # uniform distribution of book scores in the range [score_d, score_u]
     print(f'Generating instance {filename} with {B} books, {L} libraries, {D} days, {score_d} <= score <= {score_u}, {signup_d} <= signup <= {signup_u}, {eff_d} <= efficiency <= {eff_u}, {bklib_d} <= books per library <= {bklib_u}')
+    if seed is not None:
+        # the same instance every time (benchmarks)
+        random.seed(seed)
     book_scores = []
     libraries_signup_times = []
     libraries_efficiencies = []
     books_in_libraries = []
     for i in range(B):
         book_scores.append(random.randint(score_d, score_u))
+    if unique_books:
+        # every book in at most one library
+        assert L * bklib_u <= B, 'not enough books for unique_books'
+        pool = list(range(B))
+        random.shuffle(pool)
     libraries_signup_times = []
     for i in range(L):
         libraries_signup_times.append(random.randint(signup_d, signup_u))
@@ -19,7 +31,7 @@ def main(filename, B, L, D, score_d, score_u, signup_d, signup_u, eff_d, eff_u,
         no_of_books = random.randint(bklib_d, bklib_u)
         books = []
         for j in range(no_of_books):
-            books.append(random.randint(0, B-1))
+            books.append(pool.pop() if unique_books else random.randint(0, B-1))
         books_in_libraries.append(books)
     with open(filename, 'w') as f:
         f.write(f'{B} {L} {D} \n')
@@ -34,5 +46,5 @@ if __name__ == '__main__':
         print('Usage: python instance_generator.py <params.toml>')
         exit(1)
     with open(sys.argv[1], 'rb') as f:
-        params = tomli.load(f)
+        params = tomllib.load(f)
     main(**params)
@@ -1,6 +1,41 @@
 import sys
-from collections import Counter
+from collections.abc import Sequence
 from dataclasses import dataclass
+from functools import cached_property
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+
+class LibraryBooksView(Sequence):
+    """
+    Read-only list-of-lists view onto CSR arrays (`offsets`, `books`).
+
+    It lets the strategies which index `library_book_ids[j]`
+    keep working while the data itself stays in contiguous arrays.
+    """
+
+    def __init__(self, offsets: np.ndarray, books: np.ndarray):
+        self.offsets = offsets
+        self.books = books
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return [self[i] for i in range(*j.indices(len(self)))]
+        if j < 0:
+            j += len(self)
+        return self.books[self.offsets[j]:self.offsets[j + 1]].tolist()
+
+    def __iter__(self):
+        for j in range(len(self)):
+            yield self.books[self.offsets[j]:self.offsets[j + 1]].tolist()
+
+    def __deepcopy__(self, memo):
+        # deepcopy() was used to get a mutable list of lists
+        return [self[j] for j in range(len(self))]
 
 
 @dataclass
@@ -13,54 +48,280 @@ class Problem:
     D: int
 
     # S_i = score of book with ID i
-    book_scores: list[int]
+    # (converted to a NumPy array)
+    book_scores: np.ndarray
 
     # N_j = number of books in the library
     # T_j = sign-up time
     # M_j = books to scan per day
     library_signup_time: list[int]
     library_efficiency: list[int]
-    library_book_ids: list[list[int]]
+    library_book_ids: Sequence[list[int]]
 
     def __post_init__(self):
+        # Array representation of the instance
+        self.book_scores = np.asarray(self.book_scores, dtype=np.int64)
+        self.signup_time = np.asarray(self.library_signup_time,
+                                      dtype=np.int64)
+        self.efficiency = np.asarray(self.library_efficiency, dtype=np.int64)
+        if isinstance(self.library_signup_time, np.ndarray):
+            self.library_signup_time = self.library_signup_time.tolist()
+        if isinstance(self.library_efficiency, np.ndarray):
+            self.library_efficiency = self.library_efficiency.tolist()
+
+        if isinstance(self.library_book_ids, LibraryBooksView):
+            self.lib_offsets = self.library_book_ids.offsets
+            self.lib_books = self.library_book_ids.books
+        else:
+            # CSR: books of library j are lib_books[lib_offsets[j]:lib_offsets[j+1]]
+            lengths = np.fromiter((len(x) for x in self.library_book_ids),
+                                  dtype=np.int64, count=len(self.library_book_ids))
+            self.lib_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=self.lib_offsets[1:])
+            self.lib_books = np.fromiter(
+                (b for ids in self.library_book_ids for b in ids),
+                dtype=np.int32, count=int(self.lib_offsets[-1]))
+
         # Compute some statistics on this instance.
-        self.signup_time_unique_values = len(set(self.library_signup_time))
-        self.efficiency_unique_values = len(set(self.library_efficiency))
+        self.signup_time_unique_values = len(np.unique(self.signup_time))
+        self.efficiency_unique_values = len(np.unique(self.efficiency))
 
         #
-        score_set = set(self.book_scores)
-        self.every_book_has_equal_score = (len(score_set) == 1)
+        self.every_book_has_equal_score = bool(
+            self.B > 0 and self.book_scores.min() == self.book_scores.max())
         if self.every_book_has_equal_score:
             print('Fact: Every book has the same score', file=sys.stderr)
 
         #
-        ctr: Counter[int] = Counter()
-        for ids in self.library_book_ids:
-            ctr.update(ids)
-        uniqueness = set(ctr.get(b, 0)
-                         for b in range(self.B)
-                         )
-        self.is_every_book_unique = (len(uniqueness) == 1)
+        book_frequency = self.book_frequency
+        self.is_every_book_unique = bool(
+            self.B > 0 and book_frequency.min() == book_frequency.max())
         if self.is_every_book_unique:
             print('Fact: Every book is unique', file=sys.stderr)
 
-        self.upper_bound = sum(self.book_scores)
+        self.upper_bound = int(self.book_scores.sum())
         print(f' Upper bound: {self.upper_bound:_}', file=sys.stderr)
-        ub2 = 0
-        for b in range(0, self.B):
-            if ctr.get(b, 0) > 0:
-                ub2 += self.book_scores[b]
+        ub2 = int(self.book_scores[book_frequency > 0].sum())
         if ub2 < self.upper_bound and ub2 > 0:
             print(f'Better bound: {ub2:_}', file=sys.stderr)
             self.upper_bound = ub2
 
+    @classmethod
+    def from_arrays(cls, B: int, L: int, D: int,
+                    book_scores: np.ndarray,
+                    signup_time: np.ndarray,
+                    efficiency: np.ndarray,
+                    lib_offsets: np.ndarray,
+                    lib_books: np.ndarray,
+                    book_lib_offsets: Optional[np.ndarray] = None,
+                    book_libs: Optional[np.ndarray] = None) -> 'Problem':
+        """
+        Construct an instance from CSR arrays without copying them.
+
+        The inverse index can be passed if it was computed before.
+        """
+        problem = cls(B, L, D,
+                      book_scores,
+                      signup_time,
+                      efficiency,
+                      LibraryBooksView(lib_offsets, lib_books))
+        if book_lib_offsets is not None and book_libs is not None:
+            # fill the cached_property
+            problem.__dict__['_book_index'] = (book_lib_offsets, book_libs)
+        return problem
+
+    @cached_property
+    def scorer(self):
+        """Scoring engine reused by all candidates of this instance"""
+        from scoring import Scorer
+        return Scorer(self)
+
+    @cached_property
+    def features(self):
+        """Statistics of the instance (`shapes.Features`)"""
+        from shapes import extract_features
+        return extract_features(self)
+
+    @cached_property
+    def shape(self) -> str:
+        """'b', 'd' or 'general' (`shapes.classify`)"""
+        from shapes import classify
+        return classify(self.features)
+
+    # Index layer: derived arrays computed on first use
+    # and shared by all strategies.
+
+    @cached_property
+    def book_frequency(self) -> np.ndarray:
+        """Number of libraries which have book i"""
+        return np.bincount(self.lib_books, minlength=self.B)
+
+    @cached_property
+    def library_of_entry(self) -> np.ndarray:
+        """Library of every entry of `lib_books`"""
+        return np.repeat(np.arange(self.L, dtype=np.int32),
+                         np.diff(self.lib_offsets))
+
+    @cached_property
+    def _book_index(self) -> tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(self.lib_books, kind='stable')
+        offsets = np.zeros(self.B + 1, dtype=np.int64)
+        np.cumsum(self.book_frequency, out=offsets[1:])
+        return offsets, self.library_of_entry[order]
+
+    @cached_property
+    def books_by_score(self) -> np.ndarray:
+        """
+        `lib_books` with books of every library sorted by descending score
+        (the same `lib_offsets`)
+        """
+        order = np.lexsort((-self.book_scores[self.lib_books],
+                            self.library_of_entry))
+        return self.lib_books[order]
+
+    @cached_property
+    def score_prefix_sums(self) -> np.ndarray:
+        """
+        Prefix sums of `books_by_score` scores; the best k books
+        of library j are worth `p[lib_offsets[j] + k] - p[lib_offsets[j]]`
+        """
+        p = np.zeros(len(self.lib_books) + 1, dtype=np.int64)
+        np.cumsum(self.book_scores[self.books_by_score], out=p[1:])
+        return p
+
+    @cached_property
+    def initial_capacity(self) -> np.ndarray:
+        """Books library j can scan if it signs up first (on day 0)"""
+        return np.maximum(self.D - self.signup_time, 0) * self.efficiency
 
-def read_input_file(filename: str):
+    def best_books_score(self, counts: np.ndarray) -> np.ndarray:
+        """Score of the `counts[j]` best books of every library j"""
+        starts = self.lib_offsets[:-1]
+        ends = starts + np.minimum(counts, np.diff(self.lib_offsets))
+        p = self.score_prefix_sums
+        return p[ends] - p[starts]
+
+    def libraries_of(self, books: np.ndarray) -> np.ndarray:
+        """Libraries which have any of these books (with repetitions)"""
+        return gather_rows(self.book_lib_offsets, self.book_libs, books)
+
+    @property
+    def book_lib_offsets(self) -> np.ndarray:
+        """Inverse index (CSR offsets): book -> libraries which have it"""
+        return self._book_index[0]
+
+    @property
+    def book_libs(self) -> np.ndarray:
+        """libraries of book i are book_libs[book_lib_offsets[i]:book_lib_offsets[i+1]]"""
+        return self._book_index[1]
+
+
+def gather_rows(offsets: np.ndarray, values: np.ndarray,
+                rows: np.ndarray) -> np.ndarray:
+    """Concatenated rows `values[offsets[r]:offsets[r+1]]` of a CSR array"""
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    ends = np.cumsum(lengths)
+    shifts = np.repeat(starts - (ends - lengths), lengths)
+    return values[np.arange(int(ends[-1]) if len(ends) else 0) + shifts]
+
+
+def read_input_file(filename: str, bulk: bool = True):
     print(f'Reading file {filename}', file=sys.stderr)
+    if bulk:
+        with open(filename, 'rb') as f:
+            return read_stream(f)
     inp = open(filename).readlines()
     return read_lines(inp)
 
 
+class _TokenStream:
+    """Integers of a text input, parsed chunk by chunk"""
+
+    def __init__(self, f: BinaryIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        # bytes of a token cut by the end of the last chunk
+        self.rest = b''
+        self.tokens = np.empty(0, dtype=np.int64)
+        self.pos = 0
+
+    def _next_chunk(self) -> bool:
+        while True:
+            data = self.f.read(self.chunk_size)
+            if data:
+                data = self.rest + data
+                cut = max(data.rfind(b' '), data.rfind(b'\n')) + 1
+                data, self.rest = data[:cut], data[cut:]
+            else:
+                data, self.rest = self.rest, b''
+            if data.strip():
+                self.tokens = np.fromstring(data, dtype=np.int64, sep=' ')
+                self.pos = 0
+                return True
+            if not self.rest and not data:
+                return False
+
+    def read_into(self, out: np.ndarray):
+        """Fill `out` with the next `len(out)` integers"""
+        done = 0
+        while done < len(out):
+            if self.pos == len(self.tokens) and not self._next_chunk():
+                raise EOFError('unexpected end of input')
+            k = min(len(out) - done, len(self.tokens) - self.pos)
+            out[done:done + k] = self.tokens[self.pos:self.pos + k]
+            self.pos += k
+            done += k
+
+    def take(self, n: int) -> np.ndarray:
+        out = np.empty(n, dtype=np.int64)
+        self.read_into(out)
+        return out
+
+    def at_end(self) -> bool:
+        return self.pos == len(self.tokens) and not self._next_chunk()
+
+
+def read_stream(f: BinaryIO, chunk_size: int = 1 << 22) -> Problem:
+    """
+    Parse an instance from a binary file (or `sys.stdin.buffer`)
+    without holding the whole text in memory.
+
+    Book IDs go straight into one growable array,
+    peak memory is close to the size of the final arrays.
+    """
+    stream = _TokenStream(f, chunk_size)
+    B, L, D = stream.take(3).tolist()
+    book_scores = stream.take(B)
+
+    signup_time = np.empty(L, dtype=np.int64)
+    efficiency = np.empty(L, dtype=np.int64)
+    lib_offsets = np.zeros(L + 1, dtype=np.int64)
+    lib_books = np.empty(max(B, 1), dtype=np.int32)
+    used = 0
+    for j in range(L):
+        n, signup_time[j], efficiency[j] = stream.take(3).tolist()
+        if used + n > len(lib_books):
+            # realloc, large arrays usually grow in place
+            lib_books.resize(max(2 * len(lib_books), used + n),
+                             refcheck=False)
+        stream.read_into(lib_books[used:used + n])
+        used += n
+        lib_offsets[j + 1] = used
+    if not stream.at_end():
+        raise ValueError('unexpected data after the last library')
+    lib_books.resize(used, refcheck=False)
+
+    return Problem.from_arrays(
+        B, L, D,
+        book_scores,
+        signup_time,
+        efficiency,
+        lib_offsets,
+        lib_books
+    )
+
+
 def read_lines(inp: list[str]):
     B, L, D = map(int, inp[0].split())
 
@@ -6,7 +6,8 @@ except ImportError:
 import itertools
 from pathlib import Path
 
-from loader import Problem, read_input_file
+from instance_cache import read_input_file
+from loader import Problem
 import strategies.greedy as greedy
 from strategies.genetic import Genetic
 from strategies.random_solver import Random
@@ -33,7 +34,7 @@ def try_strategy(strategy: type[Strategy], instance, subfn='') -> int:
 def test_strategy_on_all(strategy: type[Strategy], *, tries=1):
     """try `strategy` on all example instances"""
     wd = Path.cwd()
-    files = [str(x.relative_to(wd)) for x in wd.glob('input/*')]
+    files = [str(x.relative_to(wd)) for x in wd.glob('input/*.txt')]
     # pprint([x.name for x in files])
 
     print('\ntesting strategy:', strategy.get_strategy_name())
@@ -76,7 +77,7 @@ def test_reading_writing():
 
 def run_solver_on_every_input(only_greedy=False):
     wd = Path.cwd()
-    files = [str(x.relative_to(wd)) for x in wd.glob('input/*')]
+    files = [str(x.relative_to(wd)) for x in wd.glob('input/*.txt')]
     print(f'{len(files)} inputs to try')
     # pprint([x.name for x in files])
 
@@ -1,100 +1,180 @@
 #!/usr/bin/env python3
 
+import argparse
 import itertools
 import sys
 import time
 from datetime import datetime as dt
+from typing import Optional
 
+import bounds
+import instance_cache
 import loader
 import our_timer
+import profiler
 import strategies.greedy as greedy
+from anytime import Anytime
 from loader import Problem
+from portfolio import run_portfolio, run_sequential
+from strategies.assignment import BookAssignment
 from strategies.genetic import Genetic
 from strategies.greedy import ALL_LIBR_BOOK_PAIRS, ALL_LIBR_GREEDY
+from strategies.islands import IslandGenetic
+from strategies.local_search import LocalSearch
 from strategies.strategies import SimpleCandidate, Strategy
 from submission import Submission
 
 
-def solve_for_this_instance(instance: Problem, only_greedy=False) -> Submission:
-    """Run the algorithm(s) on this `instance`."""
+def greedy_sorters(instance: Problem) -> list[SimpleCandidate]:
+    """The Cartesian product of library and book sorters"""
+    _bk_sorters = ALL_LIBR_BOOK_PAIRS
+    if instance.features.score_values <= 1:
+        # why would we even sort these books
+        _bk_sorters = ALL_LIBR_GREEDY
+    with profiler.span('run_sorters'):
+        out = greedy.run_sorters(instance, _bk_sorters)
+    for x in out:
+        x.books_improver()
+    return out
+
+
+def greedy_choose_library(instance: Problem) -> list[SimpleCandidate]:
+    """Library with the most unused books chosen one at a time"""
+    solver = greedy.GreedyChooseLibraryLazy(instance)
+    with profiler.span(solver.get_strategy_name()):
+        out = solver()
+    # it takes duplicates into account, no books_improver()
+    return [out] if out is not None else []
+
+
+def greedy_dynamic(instance: Problem) -> list[SimpleCandidate]:
+    """Library chosen one at a time, knowing which books are used"""
+    # the lazy variant does not rescan all libraries
+    # in every step, so there is no limit on L
+    solver = greedy.GreedyDynamicLazy(instance)
+    with profiler.span(solver.get_strategy_name()):
+        out = solver()
+    if out is None:
+        return []
+    out.books_improver()
+    return [out]
+
+
+def signup_time_order(instance: Problem) -> list[SimpleCandidate]:
+    """Shortest sign-up first (optimal for the 'b' shape)"""
+    return [greedy.GreedyBySignupTime(instance)()]
+
+
+def greedy_fast(instance: Problem) -> list[SimpleCandidate]:
+    """Libraries sorted by a static score"""
+    # try many exponents of the sign-up time, keep the best ordering
+    with profiler.span('GreedyFast.sweep'):
+        POW, score, out = greedy.GreedyFast(instance).sweep()[0]
+    print(f'GreedyFast: best POW = {POW} ({score:_})', file=sys.stderr)
+    out.books_improver()
+    return [out]
+
+
+GREEDY_TASKS = [
+    greedy_sorters,
+    greedy_dynamic,
+    greedy_fast,
+]
+
+# heuristics to run for every shape of instance (`shapes`)
+SHAPE_TASKS = {
+    'b': [signup_time_order],
+    'd': [greedy_sorters, greedy_choose_library, greedy_fast],
+    'general': GREEDY_TASKS,
+}
+# shapes whose heuristic is optimal, nothing else has to run
+EXACT_SHAPES = {'b'}
+
+
+def solve_for_this_instance(instance: Problem, only_greedy=False, workers=0,
+                            islands=0, portfolio=0,
+                            anytime: Optional[Anytime] = None,
+                            assign_books=True, target_gap=0.0) -> Submission:
+    """
+    Run the algorithm(s) on this `instance`.
+
+    With `workers` > 1 the genetic algorithm evaluates
+    its population in that many processes.
+    With `islands` > 1 that many genetic algorithms run in parallel
+    and exchange their best candidates (island model).
+    With `portfolio` > 1 the greedy heuristics run concurrently
+    in that many processes.
+    With `anytime` the best solution so far is kept on disk,
+    and the genetic algorithm resumes from its checkpoint if there is one.
+    With `assign_books` books of the local search and final results
+    are assigned optimally (`BookAssignment`).
+    The search stops early once a solution is within `target_gap`
+    (relative) of the upper bound (`bounds`), by default only
+    when it is proven optimal.
+    The heuristics depend on the shape of the instance (`shapes`),
+    shapes in `EXACT_SHAPES` are solved by their heuristic alone.
+    """
+    print(f'shape: {instance.shape} ({instance.features.describe()})',
+          file=sys.stderr)
+    if instance.shape in EXACT_SHAPES:
+        task = SHAPE_TASKS[instance.shape][0]
+        with profiler.span(task.__name__):
+            out, = task(instance)
+        if anytime is not None:
+            anytime.offer(instance.scorer.score_candidate(
+                out.libraries, out.books_in_library), out)
+        return out.to_submission()
+
+    with profiler.span('bounds'):
+        bounds.tighten(instance)
+    target = bounds.target_score(instance, target_gap)
+
+    resumed = anytime.resume() if anytime is not None else None
+    if resumed and not only_greedy:
+        # skip the greedy part
+        return solve_genetic(instance, resumed, workers, islands, anytime,
+                             assign_books, target, resumed=True)
 
     greedy_solutions: list[SimpleCandidate] = []
     # t1 = dt.now()
     t1 = our_timer.process_time_ns()
-    _bk_sorters = ALL_LIBR_BOOK_PAIRS
-    if instance.every_book_has_equal_score:
-        # why would we even sort these books
-        _bk_sorters = ALL_LIBR_GREEDY
 
-    # example b) how many stars have to align:
-    # 1. Same score
-    # 2. unique, one (or zero) copies
-    # 3. every library has
-    # 4. N_j > D (or D/M)  for all libraries
-    _b_type_instance = False
-    if instance.every_book_has_equal_score and instance.is_every_book_unique:
-        M_max = max(instance.library_efficiency)
-        M_min = min(instance.library_efficiency)
-        if M_max == M_min and all(
-            (len(instance.library_book_ids[y]) >= (instance.D * M_max))
-                for y in range(instance.L)):
-            _b_type_instance = True
-    for GRR in _bk_sorters:
-        gr_solver = GRR(instance)
-        out = gr_solver()
-        if out is not None:
-            out.books_improver()
-            greedy_solutions.append(out)
-
-    # check if the solution already is an upper bound
-    # (for example in input "a")
-    for i in greedy_solutions:
-        out_sub = out.to_submission()
-        sc = out_sub.get_submission_score()
-        if sc == instance.upper_bound:
-            # early exit
-            return out_sub
-
-    # additional heuristics which are separate
-    # from the Cartesian product above
-    # if instance.L <= 1_001:
-    #     print('both', file=sys.stderr)
-    #     for grr3 in [
-    #         greedy.GreedyChooseLibrary,
-    #         greedy.GreedyDynamic,
-    #     ]:
-    #         gr_solver = grr3(instance)
-    #         out = gr_solver()
-    #         if out is not None:
-    #             out.books_improver()
-    #             greedy_solutions.append(out)
-    if instance.L <= 10_001:  # <-- limit z c)
-        print('only dynamic', file=sys.stderr)
-        solver_m = greedy.GreedyDynamic(instance)
-        out = solver_m()
-        if out is not None:
-            out.books_improver()
-            greedy_solutions.append(out)
-
-    elif (instance.L <= 30_002  # <-- (d) only
-          and instance.every_book_has_equal_score
-          and max(len(x) for x in instance.library_book_ids) < 30):
-        print('only choose-library', file=sys.stderr)
-        solver_j = greedy.GreedyChooseLibrary(instance)
-        out = solver_j()
-        if out is not None:
-            # it takes duplicates into account
-            # out.books_improver()
-            greedy_solutions.append(out)
+    tasks = SHAPE_TASKS[instance.shape]
+    if portfolio > 1:
+        results = run_portfolio(instance, tasks, portfolio)
     else:
-        print(f'L = {instance.L}', file=sys.stderr)
-        ...  # O(L^2 * ...) is too bad for those
+        results = run_sequential(instance, tasks)
+    best_score = -1
+    best_greedy: SimpleCandidate = None  # type: ignore
+    for score, out in results:
+        greedy_solutions.append(out)
+        if anytime is not None:
+            anytime.offer(score, out)
+        if score > best_score:
+            best_score, best_greedy = score, out
+        # check if the solution already is (close to) an upper bound
+        # (for example in input "a")
+        if score >= target:
+            results.close()  # cancel the remaining heuristics
+            return out.to_submission()
 
-    greedy.GreedyFast.POW = 1.05
-    gr = greedy.GreedyFast(instance)
-    out = gr()
-    out.books_improver()
+    if best_greedy is None:
+        # the portfolio ran out of time
+        best_greedy = greedy.GreedyFast(instance)()
+        greedy_solutions.append(best_greedy)
+
+    # improve the best greedy solution with local search
+    with profiler.span('LocalSearch'):
+        out = LocalSearch(instance, best_greedy)()
+    if assign_books:
+        with profiler.span('BookAssignment'):
+            out = BookAssignment(instance, out)()
+    else:
+        out.books_improver()
     greedy_solutions.append(out)
+    score = instance.scorer.score_candidate(out.libraries, out.books_in_library)
+    if anytime is not None:
+        anytime.offer(score, out)
 
     t2 = our_timer.process_time_ns()
     print(f'greedy part took {(t2-t1)*1e-9:.2f}', file=sys.stderr)
@@ -103,19 +183,87 @@ def solve_for_this_instance(instance: Problem, only_greedy=False) -> Submission:
         return max((x.to_submission() for x in greedy_solutions),
                    key=lambda x: x.get_submission_score())
 
-    solver = Genetic(instance, )
-    solver.sub_to_cand(greedy_solutions)
-    final = solver()
+    if score >= target:
+        return out.to_submission()
+
+    return solve_genetic(instance, greedy_solutions, workers, islands, anytime,
+                         assign_books, target)
+
+
+def solve_genetic(instance: Problem, initial: list[SimpleCandidate],
+                  workers=0, islands=0,
+                  anytime: Optional[Anytime] = None,
+                  assign_books=True,
+                  target: Optional[int] = None,
+                  resumed=False) -> Submission:
+    if islands > 1:
+        # islands do not write checkpoints, only the final result
+        solver = IslandGenetic(instance, islands=islands, workers=workers,
+                               target_score=target)
+    else:
+        solver = Genetic(instance, workers=workers, anytime=anytime,
+                         target_score=target)
+    if resumed and islands <= 1:
+        # a checkpointed population, not a list of greedy solutions
+        solver.resume(initial)
+    else:
+        solver.sub_to_cand(initial)
+    with profiler.span(solver.get_strategy_name()):
+        final = solver()
+    if assign_books:
+        with profiler.span('BookAssignment'):
+            assigned = BookAssignment(instance, final)().to_submission()
+        if assigned.get_submission_score() > final.get_submission_score():
+            final = assigned
+    if anytime is not None:
+        anytime.offer(final.get_submission_score(), final)
     return final
 
 
 def main():
     """
     Entry point for the final project
+
+    The instance is read from standard input,
+    or from a file (through the binary cache) given as the first argument.
+
+    With `--anytime OUT` the best submission so far is kept in OUT
+    and the genetic population in OUT.pop; a later run with the same
+    option resumes from it.
+    With `--profile FILE` time spent in every phase is printed
+    and saved as JSON (*.json) or folded stacks (for flame graphs).
+    With `--gap G` the solver stops once the score is within G
+    (e.g. 0.01 = 1 %) of the upper bound.
+    With `--workers N` the genetic algorithm evaluates its population
+    in N processes.
+    With `--islands N` N genetic algorithms run in parallel processes
+    and exchange their best candidates.
+    With `--portfolio N` the greedy heuristics run in N processes.
     """
-    instance = loader.read_lines(sys.stdin.readlines())
-    sub = solve_for_this_instance(instance)
-    sub.write(file=sys.stdout)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', nargs='?')
+    parser.add_argument('--anytime', metavar='OUT')
+    parser.add_argument('--profile', metavar='FILE')
+    parser.add_argument('--gap', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--islands', type=int, default=0)
+    parser.add_argument('--portfolio', type=int, default=0)
+    args = parser.parse_args()
+    profiler.enable(args.profile is not None)
+    with profiler.span('load'):
+        if args.input is not None:
+            instance = instance_cache.read_input_file(args.input)
+        else:
+            instance = loader.read_stream(sys.stdin.buffer)
+    anytime = Anytime(instance, args.anytime) if args.anytime else None
+    with profiler.span('solve'):
+        sub = solve_for_this_instance(instance, anytime=anytime,
+                                      target_gap=args.gap,
+                                      workers=args.workers,
+                                      islands=args.islands,
+                                      portfolio=args.portfolio)
+    with profiler.span('write'):
+        sub.write(file=sys.stdout)
     # the process CPU time should be less than 5 minutes = 300 seconds
     print(f'process_time: {time.process_time()} s', file=sys.stderr)
     score = sub.get_submission_score()
@@ -127,6 +275,13 @@ def main():
         print(f'The score is {s:5.2f} % of upper bound',
               file=sys.stderr)
 
+    if args.profile is not None:
+        profiler.report()
+        if args.profile.endswith('.json'):
+            profiler.write_json(args.profile)
+        else:
+            profiler.write_folded(args.profile)
+
 
 if __name__ == '__main__':
     main()
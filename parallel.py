@@ -0,0 +1,61 @@
+"""
+Worker processes which share one problem instance.
+
+With the `fork` start method the instance (and any extra data)
+is inherited by the workers, nothing is pickled. On platforms
+without `fork` it is sent once to every worker by the initializer.
+"""
+import multiprocessing as mp
+from multiprocessing.pool import Pool
+from typing import Any, Optional
+
+import our_timer
+from loader import Problem
+
+# set in the parent just before forking, or by `_init_worker`
+_instance: Optional[Problem] = None
+_shared: dict[str, Any] = {}
+
+
+def _init_worker(instance: Problem, shared: dict[str, Any]):
+    global _instance, _shared
+    _instance = instance
+    _shared = shared
+
+
+def worker_instance() -> Problem:
+    """The instance shared with this worker"""
+    assert _instance is not None, 'not in a worker process'
+    return _instance
+
+
+def worker_data(key: str) -> Any:
+    """Extra data passed to `make_pool`"""
+    return _shared[key]
+
+
+def make_pool(instance: Problem, processes: int,
+              shared: Optional[dict[str, Any]] = None) -> Pool:
+    """
+    Start `processes` workers with access to `instance`.
+
+    Call it after everything in `shared` is ready,
+    later changes are not visible to the workers.
+    """
+    global _instance, _shared
+    shared = shared or {}
+    if 'fork' in mp.get_all_start_methods():
+        _instance, _shared = instance, shared
+        return mp.get_context('fork').Pool(processes)
+    return mp.get_context().Pool(processes,
+                                 initializer=_init_worker,
+                                 initargs=(instance, shared))
+
+
+def charge_results(results: list[tuple[Any, int]]) -> list[Any]:
+    """
+    Unpack (value, CPU nanoseconds) pairs returned by workers
+    and add the CPU time to the `our_timer` budget of this process.
+    """
+    our_timer.charge_cpu_time_ns(sum(ns for _, ns in results))
+    return [value for value, _ in results]
@@ -0,0 +1,106 @@
+"""
+Portfolio of strategies running concurrently in worker processes.
+
+Every task is a module-level function `task(instance)` returning
+a list of candidates. Results are streamed back as soon as a task
+finishes; the caller can stop early (for example at the upper bound)
+and the remaining tasks are cancelled.
+"""
+import multiprocessing as mp
+import sys
+import time
+from typing import Callable, Iterator
+
+import numpy as np
+
+import our_timer
+import parallel
+import profiler
+from loader import Problem
+from strategies.strategies import BookOrders, SimpleCandidate
+
+Task = Callable[[Problem], list[SimpleCandidate]]
+
+
+def pack(candidate: SimpleCandidate) -> tuple[np.ndarray, dict[int, list[int]]]:
+    """
+    Library order and the book orders of libraries which sign up in time,
+    the rest of the books do not have to be sent between processes.
+    """
+    instance = candidate.instance
+    libs, _ = instance.scorer.schedule(candidate.libraries)
+    return (np.asarray(candidate.libraries, dtype=np.int32),
+            {Y: list(candidate.books_in_library[Y]) for Y in libs.tolist()})
+
+
+def unpack(instance: Problem, packed: tuple[np.ndarray, dict[int, list[int]]]) -> SimpleCandidate:
+    libraries, own = packed
+    return SimpleCandidate.new_without_copy(
+        instance,
+        libraries.tolist(),
+        BookOrders(instance.library_book_ids, own))
+
+
+def _run_task(task: Task) -> tuple[list, int]:
+    start = our_timer.process_time_ns()
+    instance = parallel.worker_instance()
+    # start with the CPU budget which the parent had left
+    our_timer.reset_countdown_timer()
+    our_timer.charge_cpu_time_ns(our_timer.get_cpu_time_left_ns()
+                                 - parallel.worker_data('cpu_time_left_ns'))
+    out = []
+    for candidate in task(instance):
+        score = instance.scorer.score_candidate(candidate.libraries,
+                                                candidate.books_in_library)
+        out.append((score, pack(candidate)))
+    return out, our_timer.process_time_ns() - start
+
+
+def run_sequential(instance: Problem, tasks: list[Task]
+                   ) -> Iterator[tuple[int, SimpleCandidate]]:
+    """The same results as `run_portfolio`, computed in this process"""
+    for task in tasks:
+        with profiler.span(task.__name__):
+            candidates = task(instance)
+        for candidate in candidates:
+            yield instance.scorer.score_candidate(
+                candidate.libraries, candidate.books_in_library), candidate
+
+
+def run_portfolio(instance: Problem, tasks: list[Task], processes: int,
+                  reserve: float = 60) -> Iterator[tuple[int, SimpleCandidate]]:
+    """
+    Run `tasks` in `processes` workers, yield (score, candidate)
+    in the order they finish.
+
+    Waiting stops when only `reserve` CPU seconds would be left
+    (workers' CPU time is estimated by the wall time while they run).
+    Closing the generator cancels the tasks which are still running.
+    """
+    cpu_time_left_ns = our_timer.get_cpu_time_left_ns()
+    pool = parallel.make_pool(instance, min(processes, len(tasks)),
+                              {'cpu_time_left_ns': cpu_time_left_ns})
+    try:
+        results = pool.imap_unordered(_run_task, tasks)
+        start = time.perf_counter()
+        busy = min(processes, len(tasks))
+        charged = 0.0
+        for _ in tasks:
+            while True:
+                # CPU time of the workers not charged yet
+                estimate = max(0.0, (time.perf_counter() - start) * busy
+                               - charged)
+                if our_timer.get_cpu_time_left() - estimate <= reserve:
+                    print('portfolio: out of time, cancelling', file=sys.stderr)
+                    return
+                try:
+                    out, cpu_ns = results.next(timeout=0.1)
+                    break
+                except mp.TimeoutError:
+                    continue
+            our_timer.charge_cpu_time_ns(cpu_ns)
+            charged += cpu_ns * 1e-9
+            for score, packed in out:
+                yield score, unpack(instance, packed)
+    finally:
+        pool.terminate()
@@ -0,0 +1,122 @@
+"""
+Nested timing spans of solver phases.
+
+    with profiler.span('greedy'):
+        with profiler.span('GreedyFast'):
+            ...
+
+Spans are aggregated by their path (names of the enclosing spans):
+number of calls, CPU time (`our_timer.process_time_ns`) and wall time.
+Results can be printed, saved as JSON or as folded stacks
+(input of flamegraph.pl / speedscope).
+
+Profiling is off by default, then `span` returns a shared object
+whose `__enter__`/`__exit__` do nothing.
+Spans in worker processes are not collected.
+"""
+import json
+import sys
+from time import perf_counter_ns
+
+from our_timer import process_time_ns
+
+enabled = False
+
+# names of the open spans
+_stack: list[str] = []
+# path -> [calls, CPU ns, wall ns]
+_stats: dict[tuple[str, ...], list[int]] = {}
+
+
+class _Span:
+    __slots__ = ('name', 'cpu', 'wall')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        _stack.append(self.name)
+        self.cpu = process_time_ns()
+        self.wall = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        cpu = process_time_ns() - self.cpu
+        wall = perf_counter_ns() - self.wall
+        path = tuple(_stack)
+        _stack.pop()
+        stats = _stats.get(path)
+        if stats is None:
+            stats = _stats[path] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += cpu
+        stats[2] += wall
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """Context manager timing the phase `name`"""
+    if enabled:
+        return _Span(name)
+    return _NULL_SPAN
+
+
+def enable(on: bool = True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    _stats.clear()
+
+
+def _self_times() -> dict[tuple[str, ...], int]:
+    """CPU ns of every path without the time of its child spans"""
+    own = {path: s[1] for path, s in _stats.items()}
+    for path, s in _stats.items():
+        if path[:-1] in own:
+            own[path[:-1]] -= s[1]
+    return own
+
+
+def to_json() -> list[dict]:
+    own = _self_times()
+    return [dict(path=list(path), calls=s[0],
+                 cpu_s=s[1] * 1e-9, self_cpu_s=own[path] * 1e-9,
+                 wall_s=s[2] * 1e-9)
+            for path, s in sorted(_stats.items())]
+
+
+def write_json(filename: str):
+    with open(filename, 'w') as f:
+        json.dump(to_json(), f, indent=1)
+
+
+def write_folded(filename: str):
+    """One line per path: `a;b;c <self CPU microseconds>`"""
+    with open(filename, 'w') as f:
+        for path, ns in sorted(_self_times().items()):
+            if ns > 0:
+                print(f"{';'.join(path)} {ns // 1000}", file=f)
+
+
+def report(file=sys.stderr):
+    """Indented table of all spans"""
+    print(f"{'span':<48} {'calls':>8} {'CPU s':>9} {'wall s':>9}", file=file)
+    for path, (calls, cpu, wall) in sorted(_stats.items()):
+        name = '  ' * (len(path) - 1) + path[-1]
+        print(f'{name:<48} {calls:>8} {cpu * 1e-9:>9.3f} {wall * 1e-9:>9.3f}',
+              file=file)
@@ -0,0 +1,207 @@
+"""
+Array-based scoring engine.
+
+`Scorer` computes scores of whole schedules,
+`IncrementalScore` keeps the score of one signup order up to date
+after local changes (swaps, moves).
+"""
+from typing import Sequence
+
+import numpy as np
+
+import profiler
+from loader import Problem
+
+
+class Scorer:
+    """
+    Shared by all candidates of one instance (see `Problem.scorer`).
+
+    Distinct books are counted with a reusable marker array,
+    so there is no `set` and no clearing between calls.
+    """
+
+    def __init__(self, instance: Problem):
+        self.instance = instance
+        self._marker = np.zeros(instance.B, dtype=np.int64)
+        # With unique books in every library
+        # a slice never has to be deduplicated.
+        E = len(instance.lib_books)
+        lib_of_entry = instance.library_of_entry.astype(np.int64)
+        keys = lib_of_entry * max(instance.B, 1) + instance.lib_books
+        self.has_duplicates = len(np.unique(keys)) < E
+
+    def schedule(self, libraries: Sequence[int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Libraries which sign up before the deadline
+        and how many books each of them can scan.
+        """
+        libs = np.asarray(libraries, dtype=np.int64)
+        end = np.cumsum(self.instance.signup_time[libs])
+        active = np.searchsorted(end, self.instance.D)
+        libs = libs[:active]
+        capacity = (self.instance.D - end[:active]) * \
+            self.instance.efficiency[libs]
+        return libs, capacity
+
+    def distinct(self, books: np.ndarray) -> np.ndarray:
+        """Books without duplicates (one occurrence of each)"""
+        positions = np.arange(len(books))
+        self._marker[books] = positions
+        return books[self._marker[books] == positions]
+
+    def score_books(self, books: np.ndarray) -> int:
+        """Sum of scores of distinct books"""
+        return int(self.instance.book_scores[self.distinct(books)].sum())
+
+    def scanned_books(self, libraries: Sequence[int],
+                      books_in_library: Sequence[Sequence[int]]) -> np.ndarray:
+        """Concatenated books scanned by a candidate (`books_in_library[Y]`)"""
+        libs, capacity = self.schedule(libraries)
+        parts = [books_in_library[Y][:c]
+                 for Y, c in zip(libs.tolist(), capacity.tolist())]
+        return _concatenate(parts)
+
+    def score_candidate(self, libraries: Sequence[int],
+                        books_in_library: Sequence[Sequence[int]]) -> int:
+        """Score of a candidate with books ordered per library ID"""
+        with profiler.span('score'):
+            return self.score_books(self.scanned_books(libraries,
+                                                       books_in_library))
+
+    def score_flat(self, library_signups: Sequence[int],
+                   offsets: np.ndarray, books: np.ndarray) -> int:
+        """
+        Score of a submission with books in CSR arrays
+        (the i-th library scans `books[offsets[i]:offsets[i+1]]`)
+        """
+        with profiler.span('score'):
+            libs, capacity = self.schedule(library_signups)
+            starts = offsets[:len(libs)]
+            lengths = np.minimum(offsets[1:len(libs) + 1] - starts, capacity)
+            ends = np.cumsum(lengths)
+            shifts = np.repeat(starts - (ends - lengths), lengths)
+            total = int(ends[-1]) if len(ends) else 0
+            return self.score_books(books[np.arange(total) + shifts])
+
+    def validate(self, library_signups: Sequence[int],
+                 books_to_scan: Sequence[Sequence[int]]):
+        """
+        Sanity checks of a submission,
+        kept apart from the scoring itself.
+        """
+        B, L = self.instance.B, self.instance.L
+        offsets, lib_books = self.instance.lib_offsets, self.instance.lib_books
+        signups = np.asarray(library_signups, dtype=np.int64)
+        assert 0 <= len(signups) <= L
+        assert len(books_to_scan) == len(signups)
+        assert len(np.unique(signups)) == len(signups), 'duplicate sign-up'
+        assert ((0 <= signups) & (signups < L)).all(), 'bad library ID'
+        for Y, books in zip(signups.tolist(), books_to_scan):
+            books = np.asarray(books, dtype=np.int64)
+            # we want to scan something
+            assert len(books) > 0, f'library {Y} scans no books'
+            assert ((0 <= books) & (books < B)).all(), 'bad book ID'
+            # check library idx - subset
+            assert np.isin(books, lib_books[offsets[Y]:offsets[Y + 1]]).all(), \
+                f'library {Y} does not have some of the books'
+
+
+def _concatenate(parts: list) -> np.ndarray:
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(parts).astype(np.int64, copy=False)
+
+
+class IncrementalScore:
+    """
+    Score of one signup order, updated after local changes.
+
+    It counts how many scheduled libraries scan each book,
+    so after a change only the libraries whose start day moved
+    are replayed. Swapping or moving libraries inside positions
+    `lo..hi` does not change start days outside of that range.
+    """
+
+    def __init__(self, instance: Problem, libraries: Sequence[int],
+                 books_in_library: Sequence[Sequence[int]]):
+        self.instance = instance
+        self.books_in_library = books_in_library
+        self.order = np.array(libraries, dtype=np.int64)
+        # day when the library at each position finishes its sign-up
+        self.end = np.cumsum(instance.signup_time[self.order])
+        self.position = np.full(instance.L, -1, dtype=np.int64)
+        self.position[self.order] = np.arange(len(self.order))
+        self.coverage = np.zeros(instance.B, dtype=np.int32)
+        self.score = 0
+        self._arrays: dict[int, np.ndarray] = {}
+        self._replay(0, len(self.order), +1)
+
+    def _replay(self, lo: int, hi: int, sign: int):
+        """Add (sign=+1) or remove (-1) libraries at positions lo..hi-1"""
+        hi = lo + int(np.searchsorted(self.end[lo:hi], self.instance.D))
+        if hi <= lo:
+            return
+        D = self.instance.D
+        efficiency = self.instance.library_efficiency
+        books = _concatenate([
+            self._books(Y)[:(D - e) * efficiency[Y]]
+            for Y, e in zip(self.order[lo:hi].tolist(),
+                            self.end[lo:hi].tolist())
+        ])
+        # repeated books are counted as many times as they appear,
+        # the same way when adding and removing
+        books, repeats = np.unique(books, return_counts=True)
+        if sign > 0:
+            changed = books[self.coverage[books] == 0]
+            self.coverage[books] += repeats.astype(np.int32)
+        else:
+            self.coverage[books] -= repeats.astype(np.int32)
+            changed = books[self.coverage[books] == 0]
+        delta = int(self.instance.book_scores[changed].sum())
+        self.score += sign * delta
+
+    def _books(self, library: int) -> np.ndarray:
+        """Books of the library as an array (converted once)"""
+        books = self._arrays.get(library)
+        if books is None:
+            books = np.asarray(self.books_in_library[library],
+                               dtype=np.int64)
+            self._arrays[library] = books
+        return books
+
+    def permute(self, lo: int, segment: Sequence[int]) -> int:
+        """
+        Replace libraries at positions `lo..` by `segment`,
+        a permutation of them. Returns the new score.
+        """
+        hi = lo + len(segment)
+        self._replay(lo, hi, -1)
+        self.order[lo:hi] = segment
+        base = self.end[lo - 1] if lo > 0 else 0
+        self.end[lo:hi] = base + \
+            np.cumsum(self.instance.signup_time[self.order[lo:hi]])
+        self.position[self.order[lo:hi]] = np.arange(lo, hi)
+        self._replay(lo, hi, +1)
+        return self.score
+
+    def swap(self, i: int, j: int) -> int:
+        """Swap libraries at positions i and j"""
+        lo, hi = min(i, j), max(i, j)
+        segment = self.order[lo:hi + 1].copy()
+        segment[0], segment[-1] = segment[-1], segment[0]
+        return self.permute(lo, segment)
+
+    def move(self, i: int, j: int) -> int:
+        """Move the library at position i to position j"""
+        lo, hi = min(i, j), max(i, j)
+        segment = self.order[lo:hi + 1]
+        if i < j:
+            segment = np.roll(segment, -1)
+        else:
+            segment = np.roll(segment, 1)
+        return self.permute(lo, segment)
+
+    def active_count(self) -> int:
+        """Number of libraries which sign up before the deadline"""
+        return int(np.searchsorted(self.end, self.instance.D))
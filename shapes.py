@@ -0,0 +1,92 @@
+"""
+Features of an instance and the shape they imply.
+
+    b        all books have the same score, every book is in at most
+             one library, all libraries scan the same number of books
+             per day and have more books than they can ever scan.
+             Every scheduled library contributes `(D - end) * M` books,
+             so signing up the shortest libraries first is optimal.
+    d        all books have the same score, many small libraries:
+             choosing libraries one at a time by the books they still
+             add (`GreedyChooseLibraryLazy`) is the best heuristic.
+    general  everything else.
+
+`main_solver` maps every shape to the solvers it runs.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from loader import Problem
+
+# "many small libraries"
+D_MIN_LIBRARIES = 10_000
+D_MAX_LIBRARY_SIZE = 30
+
+
+@dataclass(frozen=True)
+class Features:
+    B: int
+    L: int
+    D: int
+    # number of (library, book) entries
+    E: int
+
+    # number of distinct book scores, sign-up times and efficiencies
+    score_values: int
+    signup_values: int
+    efficiency_values: int
+
+    # books in 0, 1 and more libraries
+    unused_books: int
+    single_books: int
+    shared_books: int
+    max_multiplicity: int
+
+    max_library_size: int
+    # libraries which have at least `(D - T_j) * M_j` books
+    # (they are never out of books), and which can't sign up at all
+    saturated_libraries: int
+    late_libraries: int
+
+    def describe(self) -> str:
+        return (f'B={self.B} L={self.L} D={self.D} E={self.E}, '
+                f'distinct S/T/M: {self.score_values}/{self.signup_values}/'
+                f'{self.efficiency_values}, books in 0/1/more libraries: '
+                f'{self.unused_books}/{self.single_books}/{self.shared_books} '
+                f'(max {self.max_multiplicity}), '
+                f'saturated libraries: {self.saturated_libraries}')
+
+
+def extract_features(instance: Problem) -> Features:
+    frequency = instance.book_frequency
+    sizes = np.diff(instance.lib_offsets)
+    return Features(
+        B=instance.B,
+        L=instance.L,
+        D=instance.D,
+        E=len(instance.lib_books),
+        score_values=len(np.unique(instance.book_scores)),
+        signup_values=instance.signup_time_unique_values,
+        efficiency_values=instance.efficiency_unique_values,
+        unused_books=int(np.count_nonzero(frequency == 0)),
+        single_books=int(np.count_nonzero(frequency == 1)),
+        shared_books=int(np.count_nonzero(frequency > 1)),
+        max_multiplicity=int(frequency.max()) if instance.B else 0,
+        max_library_size=int(sizes.max()) if instance.L else 0,
+        saturated_libraries=int(np.count_nonzero(
+            sizes >= instance.initial_capacity)),
+        late_libraries=int(np.count_nonzero(instance.initial_capacity == 0)),
+    )
+
+
+def classify(features: Features) -> str:
+    """Shape of an instance (see the module docstring)"""
+    f = features
+    if f.score_values <= 1 and f.max_multiplicity <= 1 \
+            and f.efficiency_values <= 1 and f.saturated_libraries == f.L:
+        return 'b'
+    if f.score_values <= 1 and f.L > D_MIN_LIBRARIES \
+            and f.max_library_size < D_MAX_LIBRARY_SIZE:
+        return 'd'
+    return 'general'
@@ -0,0 +1,147 @@
+from collections import deque
+from sys import stderr
+
+import numpy as np
+
+import our_timer
+from loader import gather_rows
+from .strategies import (BookOrders, Problem,
+                         SimpleCandidate, Strategy, Submission)
+
+
+class BookAssignment(Strategy):
+    """
+    Optimal books for a fixed sign-up order.
+
+    Libraries which sign up in time can scan `(D - start day) * M` books;
+    which book goes to which library is a bipartite matching problem
+    (max-weight b-matching, i.e. max-cost flow). Sets of books which can
+    be scanned together form a transversal matroid, so taking books
+    in descending score order whenever they still fit is optimal.
+    A book fits if it has a library with a free slot, or an augmenting
+    path moves already assigned books to other libraries to make one.
+
+    Libraries from which no free slot could be reached stay that way
+    (an augmentation never changes their books), so failed searches
+    are not repeated: the total work is close to linear in practice.
+
+    After `time_limit` CPU seconds books are only placed into free slots.
+    """
+
+    def __init__(self, instance: Problem,
+                 candidate: 'SimpleCandidate | Submission',
+                 time_limit: float = 30.0):
+        super().__init__(instance)
+        self.candidate = candidate
+        self.time_limit = time_limit
+
+    def __call__(self) -> SimpleCandidate:
+        instance = self.instance
+        if isinstance(self.candidate, Submission):
+            order = list(self.candidate.library_signups)
+        else:
+            order = list(self.candidate.libraries)
+        libs, capacity = instance.scorer.schedule(order)
+
+        scheduled = np.zeros(instance.L, dtype=bool)
+        scheduled[libs] = True
+        free = np.zeros(instance.L, dtype=np.int64)
+        free[libs] = capacity
+        free = free.tolist()
+        dead = [False] * instance.L
+        members: dict[int, set[int]] = {Y: set() for Y in libs.tolist()}
+        owner: dict[int, int] = {}
+
+        # candidate books, best first
+        in_schedule = np.zeros(instance.B, dtype=bool)
+        in_schedule[gather_rows(instance.lib_offsets, instance.lib_books,
+                                libs)] = True
+        books = np.flatnonzero(in_schedule & (instance.book_scores > 0))
+        books = books[np.argsort(-instance.book_scores[books], kind='stable')]
+
+        # scheduled libraries of every candidate book (CSR)
+        entries = gather_rows(instance.book_lib_offsets, instance.book_libs,
+                              books)
+        keep = scheduled[entries]
+        lengths = instance.book_lib_offsets[books + 1] \
+            - instance.book_lib_offsets[books]
+        row_of_entry = np.repeat(np.arange(len(books)), lengths)
+        offsets = np.zeros(len(books) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_of_entry[keep], minlength=len(books)),
+                  out=offsets[1:])
+        flat = entries[keep].tolist()
+        offsets = offsets.tolist()
+        position = np.zeros(instance.B, dtype=np.int64)
+        position[books] = np.arange(len(books))
+        position = position.tolist()
+
+        def scheduled_libraries(b: int) -> list[int]:
+            k = position[b]
+            return flat[offsets[k]:offsets[k + 1]]
+
+        def augment(b: int, start: list[int]) -> bool:
+            # BFS over libraries; parent[l] = (book moved into l, its old library)
+            parent: dict[int, tuple[int, int]] = {}
+            queue = deque()
+            for Y in start:
+                if not dead[Y] and Y not in parent:
+                    parent[Y] = (b, -1)
+                    queue.append(Y)
+            while queue:
+                Y = queue.popleft()
+                for b2 in members[Y]:
+                    for Y2 in scheduled_libraries(b2):
+                        if dead[Y2] or Y2 in parent:
+                            continue
+                        parent[Y2] = (b2, Y)
+                        if free[Y2] > 0:
+                            free[Y2] -= 1
+                            while Y2 != -1:
+                                moved, old = parent[Y2]
+                                if old != -1:
+                                    members[old].remove(moved)
+                                members[Y2].add(moved)
+                                owner[moved] = Y2
+                                Y2 = old
+                            return True
+                        queue.append(Y2)
+            for Y in parent:
+                dead[Y] = True
+            return False
+
+        deadline = our_timer.process_time_ns() + int(self.time_limit * 1e9)
+        searching = True
+        augmented = 0
+        for i, b in enumerate(books.tolist()):
+            if i % 1000 == 0 and searching:
+                if our_timer.process_time_ns() > deadline \
+                        or our_timer.get_cpu_time_left() <= 30:
+                    print('book assignment: out of time', file=stderr)
+                    searching = False
+            ls = scheduled_libraries(b)
+            for Y in ls:
+                if free[Y] > 0:
+                    free[Y] -= 1
+                    members[Y].add(b)
+                    owner[b] = Y
+                    break
+            else:
+                if searching and augment(b, ls):
+                    augmented += 1
+
+        print(f'book assignment: {len(owner)} books, '
+              f'{augmented} by augmenting paths', file=stderr)
+
+        # assigned books first (best first), then the others
+        scores = instance.book_scores
+        own = {}
+        for Y, assigned in members.items():
+            chosen = np.fromiter(assigned, dtype=np.int64, count=len(assigned))
+            chosen = chosen[np.argsort(-scores[chosen], kind='stable')].tolist()
+            rest = [x for x in instance.library_book_ids[Y]
+                    if x not in assigned]
+            own[Y] = chosen + rest
+        return SimpleCandidate.new_without_copy(
+            instance,
+            order,
+            BookOrders(instance.library_book_ids, own))
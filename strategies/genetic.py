@@ -1,51 +1,96 @@
 import random
-from copy import deepcopy
 from sys import stderr
 from typing import Optional
 
+import numpy as np
+
 import our_timer
-from .strategies import Problem, SimpleCandidate, Strategy, Submission
+import parallel
+import profiler
+from loader import LibraryBooksView
+from .strategies import (BookOrders, Problem, SimpleCandidate, Strategy,
+                         Submission)
+
+
+def shuffled_book_ids(instance: Problem) -> LibraryBooksView:
+    """
+    Books of every library in a random order, computed once per instance
+    and shared by all random candidates.
+    """
+    view = getattr(instance, '_shuffled_book_ids', None)
+    if view is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+        keys = rng.random(len(instance.lib_books))
+        order = np.lexsort((keys, instance.library_of_entry))
+        view = LibraryBooksView(instance.lib_offsets,
+                                instance.lib_books[order])
+        instance._shuffled_book_ids = view
+    return view
 
 
 class Candidate(SimpleCandidate):
-    def __init__(self, instance: Problem, libraries: Optional[list[int]], books_in_library: Optional[list[list[int]]]):
+    """
+    Genome: permutation of libraries (NumPy array)
+    and book orders shared with other candidates (copy-on-write).
+    """
+    # How many times fitness() was really computed
+    # and how many times the memoized value was returned.
+    evaluations = 0
+    cache_hits = 0
+
+    def __init__(self, instance: Problem, libraries: 'Optional[list[int] | np.ndarray]', books_in_library: 'Optional[list[list[int]] | BookOrders]'):
         # shuffle the order of libraries
         self.instance = instance
 
         if libraries is None:
-            self.libraries = list(range(instance.L))
-            random.shuffle(self.libraries)
+            order = list(range(instance.L))
+            random.shuffle(order)
+            self.libraries = np.array(order, dtype=np.int32)
         else:
-            self.libraries = libraries
+            self.libraries = np.array(libraries, dtype=np.int32)
 
+        self.books_in_library: BookOrders
         if books_in_library is None:
-            self.books_in_library = deepcopy(instance.library_book_ids)
-            for library in self.books_in_library:
-                random.shuffle(library)
+            self.books_in_library = BookOrders(shuffled_book_ids(instance))
+        elif isinstance(books_in_library, BookOrders):
+            self.books_in_library = books_in_library.copy()
         else:
-            self.books_in_library = deepcopy(books_in_library)
+            # shared, lists are never modified in place
+            self.books_in_library = BookOrders(books_in_library)
+
+        # memoized fitness, None when the genome has changed
+        self._fitness: Optional[int] = None
+        # index of the book orders shared with worker processes
+        self.books_key: Optional[int] = None
 
     def clone(self):
-        """Clone this Candidate (deep copy)"""
+        """Clone this Candidate (book orders are shared)"""
         # the same naming as in Rust :)
-        return Candidate(self.instance,
-                         self.libraries.copy(),
-                         deepcopy(self.books_in_library)
-                         )
+        c = Candidate(self.instance,
+                      self.libraries,
+                      self.books_in_library
+                      )
+        c._fitness = self._fitness
+        c.books_key = self.books_key
+        return c
+
+    def invalidate(self):
+        """Forget the memoized fitness after changing the genome"""
+        self._fitness = None
 
     def fitness(self) -> int:
-        time_to_alloc = self.instance.D
-        score = 0
-        seen_books = set()
-        for library in self.libraries:
-            time_to_alloc -= self.instance.library_signup_time[library]
-            if time_to_alloc <= 0:
-                break
-            for bookidx in range(min(time_to_alloc * self.instance.library_efficiency[library], len(self.books_in_library[library]))):
-                if self.books_in_library[library][bookidx] not in seen_books:
-                    seen_books.add(self.books_in_library[library][bookidx])
-                    score += self.instance.book_scores[self.books_in_library[library][bookidx]]
-        return score
+        if self._fitness is not None:
+            Candidate.cache_hits += 1
+            return self._fitness
+        Candidate.evaluations += 1
+        self._fitness = self.instance.scorer.score_candidate(
+            self.libraries, self.books_in_library)
+        return self._fitness
+
+    def books_improver(self):
+        super().books_improver()
+        self.invalidate()
+        self.books_key = None
 
     @staticmethod
     def from_submission(subm: Submission):
@@ -54,27 +99,47 @@ class Candidate(SimpleCandidate):
             lookup_library[Y] = i
         r = Candidate(subm.instance,
                       list(subm.library_signups),
-                      [
+                      BookOrders(subm.instance.library_book_ids, {
                           # Submission stores books in the order of sign-ups
-                          subm.books_to_scan[lookup_library[i]]
-                          if i in lookup_library
-                          else list(subm.instance.library_book_ids[i])
-                          for i in range(subm.instance.L)
-                      ]
+                          Y: list(subm.books_to_scan[i])
+                          for Y, i in lookup_library.items()
+                      })
                       )
         return r
 
     def mutate(self):
         RATE = 0.4
-        for i in range(len(self.libraries)):
-            if random.random() < RATE:
-                j = random.randint(0, len(self.libraries) - 1)
-                self.libraries[i], self.libraries[j] = self.libraries[j], self.libraries[i]
+        n = len(self.libraries)
+        # seeded by `random`, like the rest of the genetic algorithm
+        rng = np.random.default_rng(random.getrandbits(64))
+        swaps = np.flatnonzero(rng.random(n) < RATE)
+        if len(swaps) == 0:
+            return self
+        targets = rng.integers(0, n, len(swaps))
+        # the swaps depend on each other, apply them in order
+        order = self.libraries.tolist()
+        for i, j in zip(swaps.tolist(), targets.tolist()):
+            order[i], order[j] = order[j], order[i]
+        self.libraries = np.array(order, dtype=np.int32)
+        self.invalidate()
         return self
 
 
+def _evaluate_genome(genome: tuple[int, np.ndarray]) -> tuple[int, int]:
+    """Fitness computed in a worker process (and its CPU time)"""
+    t = our_timer.process_time_ns()
+    books_key, libraries = genome
+    books_in_library = parallel.worker_data('books')[books_key]
+    score = parallel.worker_instance().scorer.score_candidate(
+        libraries, books_in_library)
+    return score, our_timer.process_time_ns() - t
+
+
 class Genetic(Strategy):
-    def __init__(self, instance: Problem, population_size: int = 20, mutation_rate: float = 0.7, crossover_rate: float = 0.3, tournament_size: int = 3, max_generations: int = 10, max_stagnation: int = 50):
+    # stop with this many CPU seconds left
+    CPU_RESERVE = 20
+
+    def __init__(self, instance: Problem, population_size: int = 20, mutation_rate: float = 0.7, crossover_rate: float = 0.3, tournament_size: int = 3, max_generations: int = 10, max_stagnation: int = 50, workers: int = 0, seed: Optional[int] = None, anytime=None, target_score: Optional[int] = None):
         super().__init__(instance)
         self.population_size = population_size
         self.mutation_rate = mutation_rate
@@ -84,18 +149,39 @@ class Genetic(Strategy):
         self.max_stagnation = max_stagnation
         self.elitism_no = 5
         self.initial_pop: list[Candidate] = []
+        # random candidates added to `initial_pop`
+        self.random_candidates = population_size
+        # evaluate fitness in this many processes (0 or 1 - serially)
+        self.workers = workers
+        self.seed = seed
+        self._pool = None
+        # `anytime.Anytime`: best-so-far output and population checkpoints
+        self.anytime = anytime
+        # stop when the best fitness reaches this (see `bounds`)
+        self.target_score = target_score
 
     def sub_to_cand(self, sub_list: list[SimpleCandidate]):
         for it in sub_list:
             self.initial_pop.append(
                 Candidate(it.instance, it.libraries, it.books_in_library))
 
+    def resume(self, population: list[SimpleCandidate]):
+        """
+        Continue from a checkpointed population (`anytime`), at most
+        `population_size` candidates, random ones only to fill it up.
+        """
+        self.sub_to_cand(population[:self.population_size])
+        self.random_candidates = max(
+            self.population_size - len(self.initial_pop), 0)
+
     def crossover(self, candidate1: Candidate, candidate2: Candidate):
+        libs1 = candidate1.libraries.tolist()
+        libs2 = candidate2.libraries.tolist()
         child_libraries1, child_libraries2 = [], []
         to_fill1, to_fill2 = set(), set()
-        for i in range(len(candidate1.libraries)):
-            add_to_child1 = candidate1.libraries[i] if i % 2 == 0 else candidate2.libraries[i]
-            add_to_child2 = candidate2.libraries[i] if i % 2 == 0 else candidate1.libraries[i]
+        for i in range(len(libs1)):
+            add_to_child1 = libs1[i] if i % 2 == 0 else libs2[i]
+            add_to_child2 = libs2[i] if i % 2 == 0 else libs1[i]
             if add_to_child1 not in child_libraries1:
                 child_libraries1.append(add_to_child1)
             if add_to_child2 not in child_libraries2:
@@ -104,21 +190,55 @@ class Genetic(Strategy):
                 to_fill2.add(add_to_child1)
             if add_to_child2 not in child_libraries1:
                 to_fill1.add(add_to_child2)
-        for i in range(len(candidate1.libraries)):
+        for i in range(len(libs1)):
             if len(to_fill1) == 0:
                 break
-            if candidate1.libraries[i] in to_fill1:
-                child_libraries1.append(candidate1.libraries[i])
-                to_fill1.remove(candidate1.libraries[i])
-        for i in range(len(candidate2.libraries)):
+            if libs1[i] in to_fill1:
+                child_libraries1.append(libs1[i])
+                to_fill1.remove(libs1[i])
+        for i in range(len(libs2)):
             if len(to_fill2) == 0:
                 break
-            if candidate2.libraries[i] in to_fill2:
-                child_libraries2.append(candidate2.libraries[i])
-                to_fill2.remove(candidate2.libraries[i])
-        child_books1 = deepcopy(candidate1.books_in_library)
-        child_books2 = deepcopy(candidate2.books_in_library)
-        return Candidate(self.instance, child_libraries1, child_books1), Candidate(self.instance, child_libraries2, child_books2)
+            if libs2[i] in to_fill2:
+                child_libraries2.append(libs2[i])
+                to_fill2.remove(libs2[i])
+        # book orders are shared (copy-on-write)
+        child_books1 = candidate1.books_in_library
+        child_books2 = candidate2.books_in_library
+        child1 = Candidate(self.instance, child_libraries1, child_books1)
+        child2 = Candidate(self.instance, child_libraries2, child_books2)
+        child1.books_key = candidate1.books_key
+        child2.books_key = candidate2.books_key
+        return child1, child2
+
+    def start_workers(self, population: list[Candidate]):
+        """
+        Share book orders of the population with the worker processes,
+        afterwards only library orders are sent to them.
+        """
+        books = []
+        for i, candidate in enumerate(population):
+            candidate.books_key = i
+            books.append(candidate.books_in_library)
+        self._pool = parallel.make_pool(self.instance, self.workers,
+                                        {'books': books})
+
+    def evaluate_population(self, population: list[Candidate]):
+        """Fill fitness caches of the population using the workers"""
+        if self._pool is None:
+            return
+        pending = [c for c in population
+                   if c._fitness is None and c.books_key is not None]
+        pending = list({id(c): c for c in pending}.values())
+        if not pending:
+            return
+        genomes = [(c.books_key, np.asarray(c.libraries, dtype=np.int32))
+                   for c in pending]
+        chunksize = max(1, len(genomes) // (4 * self.workers))
+        results = self._pool.map(_evaluate_genome, genomes, chunksize)
+        for c, score in zip(pending, parallel.charge_results(results)):
+            c._fitness = score
+        Candidate.evaluations += len(pending)
 
     def tournament_selection(self, population: list[Candidate]) -> Candidate:
         best: Candidate = None  # type: ignore
@@ -129,45 +249,90 @@ class Genetic(Strategy):
                 best = candidate
         return best
 
+    def initial_population(self) -> list[Candidate]:
+        """Random candidates and the ones from `sub_to_cand`"""
+        if self.seed is not None:
+            random.seed(self.seed)
+        population = [Candidate(self.instance, None, None)
+                      for _ in range(self.random_candidates)]
+        population.extend(self.initial_pop)
+        return population
+
     def __call__(self):
+        population = self.initial_population()
+        if self.workers > 1:
+            self.start_workers(population)
+        try:
+            return self.evolve(population).to_submission()
+        finally:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+    def migrate(self, generation: int, population: list[Candidate]):
+        """Called every generation with the sorted population"""
+        ...
+
+    def evolve(self, population: list[Candidate]) -> Candidate:
         stagnation = 0
         best: Candidate = None  # type: ignore
-        population = [Candidate(self.instance, None, None)
-                      for _ in range(self.population_size)]
-        population.extend(self.initial_pop)
+        self.evaluate_population(population)
         print('initial best fitness: ', max(x.fitness()
               for x in population), file=stderr)
 
+        evaluations, cache_hits = Candidate.evaluations, Candidate.cache_hits
+        checkpointed = None
         for generation in range(self.max_generations):
-            population.sort(key=lambda x: x.fitness(), reverse=True)
+            with profiler.span('fitness'):
+                self.evaluate_population(population)
+                population.sort(key=lambda x: x.fitness(), reverse=True)
             if best is None or population[0].fitness() > best.fitness():
                 best = population[0].clone()  # copy (!)
                 stagnation = 0
             else:
                 stagnation += 1
+            self.migrate(generation, population)
+            if self.anytime is not None:
+                self.anytime.offer(best.fitness(), best)
+                # the population does not always contain the best one
+                checkpointed = [best] + population
+                self.anytime.checkpoint(generation, checkpointed)
             if stagnation > self.max_stagnation:
                 break
-            if our_timer.get_cpu_time_left() <= 20:
-                break  # 30 seconds left
+            if self.target_score is not None \
+                    and best.fitness() >= self.target_score:
+                print(f'target score {self.target_score} reached', file=stderr)
+                break
+            if our_timer.get_cpu_time_left() <= self.CPU_RESERVE:
+                break
             print(f"Generation {generation}: {population[0].fitness()}, "
-                  f"mean: {sum([x.fitness() for x in population]) / len(population)}", file=stderr)
+                  f"mean: {sum([x.fitness() for x in population]) / len(population)}, "
+                  f"evaluations: {Candidate.evaluations - evaluations}, "
+                  f"cache hits: {Candidate.cache_hits - cache_hits}", file=stderr)
+            evaluations, cache_hits = Candidate.evaluations, Candidate.cache_hits
 
             new_population = []
             for i in range(self.elitism_no):
                 new_population.append(population[i])
             for i in range(self.population_size - self.elitism_no):
-                candidate1 = self.tournament_selection(population)
-                candidate2 = self.tournament_selection(population)
+                with profiler.span('selection'):
+                    candidate1 = self.tournament_selection(population)
+                    candidate2 = self.tournament_selection(population)
                 if 10 < self.crossover_rate:
-                    child1, child2 = self.crossover(candidate1, candidate2)
+                    with profiler.span('crossover'):
+                        child1, child2 = self.crossover(candidate1, candidate2)
                     new_population.append(child1)
                     new_population.append(child2)
                 else:
                     new_population.append(candidate1)
                     new_population.append(candidate2)
-            for candidate in new_population:
-                if random.random() < self.mutation_rate:
-                    candidate.mutate()
+            with profiler.span('mutation'):
+                for candidate in new_population:
+                    if random.random() < self.mutation_rate:
+                        candidate.mutate()
             population = new_population
+        if checkpointed is not None:
+            # the generations after the last (throttled) checkpoint
+            self.anytime.checkpoint(generation, checkpointed, force=True)
         print(f"Best: {best.fitness()}", file=stderr)
-        return best.to_submission()
+        return best
@@ -1,12 +1,13 @@
 import gc
+import heapq
 import itertools
-from collections import Counter
-from copy import deepcopy
 from typing import Optional
 
 import numpy as np
 
-from .strategies import Problem, SimpleCandidate, Strategy, Submission
+from loader import LibraryBooksView
+
+from .strategies import BookOrders, Problem, SimpleCandidate, Strategy, Submission
 
 import our_timer
 import sys
@@ -21,33 +22,38 @@ class GreedyBase(Strategy):
         self.book_asc = True
 
     def __call__(self) -> SimpleCandidate:
-        L = self.instance.L
-        signup_order = list(range(L))
-        signup_order.sort(key=self.key_libr,
-                          reverse=not self.libr_asc)
-
-        books_in_library = []
-        for list_of_book_ids in self.instance.library_book_ids:
-            # list() vs .copy() - idk
-            books = list(list_of_book_ids)
-            books.sort(key=self.key_book, reverse=not self.book_asc)
-            books_in_library.append(books)
-            # NOTE: ignore the deadline for now,
-            #       it will be useful for evolutionary programming
-
+        # NOTE: ignore the deadline for now,
+        #       it will be useful for evolutionary programming
         return SimpleCandidate.new_without_copy(
             self.instance,
-            signup_order,
-            books_in_library)
-
-    def key_libr(self, y: int):
-        """key used to sort libraries"""
-        # raise NotImplementedError('key_libr')
-        return 0  # do not sort
-
-    def key_book(self, b: int):
-        """key function used to sort books"""
-        return 0  # do not sort
+            self.library_order().tolist(),
+            BookOrders(self.book_order()))
+
+    def libr_keys(self) -> Optional[np.ndarray]:
+        """keys used to sort libraries (one per library)"""
+        return None  # do not sort
+
+    def book_keys(self) -> Optional[np.ndarray]:
+        """keys used to sort books (one per book)"""
+        return None  # do not sort
+
+    def library_order(self) -> np.ndarray:
+        """Libraries sorted by `libr_keys` (stable, like list.sort)"""
+        keys = self.libr_keys()
+        if keys is None:
+            return np.arange(self.instance.L)
+        return np.argsort(keys if self.libr_asc else -keys, kind='stable')
+
+    def book_order(self) -> LibraryBooksView:
+        """Books of every library sorted by `book_keys` (stable)"""
+        instance = self.instance
+        keys = self.book_keys()
+        if keys is None:
+            return LibraryBooksView(instance.lib_offsets, instance.lib_books)
+        keys = keys[instance.lib_books]
+        order = np.lexsort((keys if self.book_asc else -keys,
+                            instance.library_of_entry))
+        return LibraryBooksView(instance.lib_offsets, instance.lib_books[order])
 
 # tags to make type checkers happy
 
@@ -71,9 +77,9 @@ class GreedyByEfficiencyL(LibrarySorter):
         super().__init__(instance)
         self.libr_asc = True
 
-    def key_libr(self, y: int):
+    def libr_keys(self):
         # lowest R_i are first
-        return self.instance.library_efficiency[y]
+        return self.instance.efficiency
 
 
 class GreedyByEfficiencyH(GreedyByEfficiencyL):
@@ -88,8 +94,8 @@ class GreedyBySignupTime(LibrarySorter):
         super().__init__(instance)
         self.libr_asc = True
 
-    def key_libr(self, y: int):
-        return self.instance.library_signup_time[y]
+    def libr_keys(self):
+        return self.instance.signup_time
 
 
 class GreedyByLength(LibrarySorter):
@@ -97,8 +103,8 @@ class GreedyByLength(LibrarySorter):
         super().__init__(instance)
         self.libr_asc = False
 
-    def key_libr(self, y: int):
-        return len(self.instance.library_book_ids[y])
+    def libr_keys(self):
+        return np.diff(self.instance.lib_offsets)
 
 
 class GreedyByEfficiencyToSignup(LibrarySorter):
@@ -106,9 +112,9 @@ class GreedyByEfficiencyToSignup(LibrarySorter):
         super().__init__(instance)
         self.libr_asc = False
 
-    def key_libr(self, y: int):
-        M = self.instance.library_efficiency[y]  # higher better
-        T = self.instance.library_signup_time[y]  # lower better
+    def libr_keys(self):
+        M = self.instance.efficiency  # higher better
+        T = self.instance.signup_time  # lower better
         return M / T
 
 # greedy heuristics for book(s) only
@@ -119,24 +125,20 @@ class GreedyBookScore(BookSorter):
         super().__init__(instance)
         self.book_asc = False
 
-    def key_book(self, b: int):
-        return self.instance.book_scores[b]
+    def book_keys(self):
+        return self.instance.book_scores
 
 
 class GreedyBookDuplicates(BookSorter):
-    def key_book(self, b: int):
-        return self.duplicate_count.get(b)
+    def book_keys(self):
+        return self.duplicate_count
 
     def __init__(self, instance: Problem):
         super().__init__(instance)
         self.book_asc = True
 
-        ctr: Counter[int] = Counter()
-        for ids in self.instance.library_book_ids:
-            ctr.update(ids)
-
-        self.duplicate_count = dict(ctr)
-        # : dict[int, int]
+        # number of libraries which have the book
+        self.duplicate_count = self.instance.book_frequency
 
 
 class GreedyBookScoreAndUniqueness(GreedyBookDuplicates):
@@ -144,14 +146,13 @@ class GreedyBookScoreAndUniqueness(GreedyBookDuplicates):
         super().__init__(instance)
         self.book_asc = False  # order by higher score
 
-    def key_book(self, b: int):
+    def book_keys(self):
         # Better book is unique (little duplicates) and has high score.
-        dupl = self.duplicate_count.get(b, 0)
         # unique book gets score * 10
         # with 1 duplicate (x=2) gets score * 90%
         # Limit the multiplier to 1 -- when x >= 10
-        c = max(11 - 1 * dupl, 1)
-        return c * self.instance.book_scores[b]
+        c = np.maximum(11 - 1 * self.duplicate_count, 1)
+        return c * self.instance.book_scores
 
 # greedy heuristics for both
 
@@ -175,10 +176,9 @@ class GreedyChooseLibrary(GreedyBase):
         # These sets are updated later,
         # so that they contain only unseen books.
         books_in_lib_sets: list[set[int]] = []
-        for list_of_book_ids in self.instance.library_book_ids:
-            books = list(list_of_book_ids)
-            books.sort(key=self.instance.book_scores.__getitem__,
-                       reverse=True)  # descending scores
+        for books in LibraryBooksView(self.instance.lib_offsets,
+                                      self.instance.books_by_score):
+            # descending scores
             num_books_in_library.append(len(books))
             books_in_library.append(books)
             books_in_lib_sets.append(set(books))
@@ -267,23 +267,93 @@ class GreedyChooseLibrary(GreedyBase):
             books_in_library)
 
 
+class GreedyChooseLibraryLazy(GreedyBase):
+    """
+    GreedyChooseLibrary with incrementally maintained keys.
+
+    Every library keeps the number of its unseen books. When books
+    are seen, only the libraries which have them (inverse index)
+    are updated. Keys never grow, so libraries wait in a max-heap
+    keyed by their last computed key and only the top is recomputed;
+    it is chosen when its key is still the same, otherwise pushed back.
+    Libraries are chosen (and books marked as seen) exactly as in
+    GreedyChooseLibrary.
+    """
+
+    def __call__(self) -> Optional[SimpleCandidate]:
+        instance = self.instance
+        if not instance.every_book_has_equal_score:
+            return None
+
+        offsets = instance.lib_offsets
+        by_score = instance.books_by_score
+        signup = instance.library_signup_time
+        B = instance.B
+        seen = np.zeros(B, dtype=bool)
+        # distinct books of every library (a library may list one twice)
+        pairs = np.unique(instance.library_of_entry.astype(np.int64) * B
+                          + instance.lib_books)
+        unseen_count = np.bincount(pairs // B, minlength=instance.L)
+        days = instance.D
+
+        def key(lib: int) -> int:
+            return min(days - signup[lib], int(unseen_count[lib]))
+
+        # ties are broken by the lower index, as in GreedyChooseLibrary
+        heap = [(-key(lib), lib) for lib in range(instance.L)
+                if signup[lib] <= days]
+        heapq.heapify(heap)
+
+        signup_order = []
+        while days > 0 and heap:
+            neg_key, lib = heapq.heappop(heap)
+            if signup[lib] > days:
+                continue  # it will never fit again
+            current = key(lib)
+            if current < -neg_key:
+                heapq.heappush(heap, (-current, lib))
+                continue
+
+            signup_order.append(lib)
+            # the first `days - T` books (seen or not) are scanned
+            end = min(offsets[lib + 1], offsets[lib] + days - signup[lib])
+            books = by_score[offsets[lib]:end]
+            scanned = np.unique(books[~seen[books]])
+            seen[scanned] = True
+            lengths = (instance.book_lib_offsets[scanned + 1]
+                       - instance.book_lib_offsets[scanned])
+            pairs = np.unique(instance.libraries_of(scanned).astype(np.int64) * B
+                              + np.repeat(scanned, lengths))
+            libs, counts = np.unique(pairs // B, return_counts=True)
+            unseen_count[libs] -= counts
+            days -= signup[lib]
+            if len(signup_order) % 1000 == 20:
+                if our_timer.get_cpu_time_left() <= 30:
+                    return None  # 30 seconds left, start panicking
+
+        return SimpleCandidate.new_without_copy(
+            instance,
+            signup_order,
+            BookOrders(LibraryBooksView(offsets, by_score)))
+
+
 class GreedyDynamic(GreedyBase):
     def __init__(self, instance: Problem):
         super().__init__(instance)
         self.instance = instance
-        self.books_in_libs = deepcopy(self.instance.library_book_ids)
 
     def get_best_library(self, time_left: int, libraries: set[int], used_books: set) -> int:
         # pair (score, lib_idx)
         best: tuple[float, Optional[int]] = (0.0, None)
         for lib in libraries:
             if self.instance.library_signup_time[lib] <= time_left:
-                self.books_in_libs[lib].sort(
+                books = sorted(
+                    self.instance.library_book_ids[lib],
                     key=lambda x: self.instance.book_scores[x] if x not in used_books else 0, reverse=True)
                 books_to_scan = (
                     time_left - self.instance.library_signup_time[lib]) * self.instance.library_efficiency[lib]
                 score = sum(self.instance.book_scores[b]
-                            for b in self.books_in_libs[lib][:books_to_scan])/(self.instance.library_signup_time[lib])
+                            for b in books[:books_to_scan])/(self.instance.library_signup_time[lib])
                 if score > best[0]:
                     best = (score, lib)
         return best[1]
@@ -324,30 +394,144 @@ class GreedyDynamic(GreedyBase):
             if our_timer.get_cpu_time_left() <= 30:
                 return None  # 30 seconds left, start panicking
         library_signups.extend(libraries_not_signed_up)
-        output = SimpleCandidate(self.instance,
-                                 library_signups, self.books_in_libs)
+        output = SimpleCandidate.new_without_copy(
+            self.instance,
+            library_signups,
+            BookOrders(self.instance.library_book_ids))
         return output
 
 
+class GreedyDynamicLazy(GreedyBase):
+    """
+    GreedyDynamic (`get_best_library_better`) with lazy evaluation.
+
+    A library's score never grows: books only get used
+    and time only runs out. Libraries wait in a max-heap keyed by
+    their last computed score; only the one on top is evaluated again,
+    and only when it could have changed since.
+    """
+    POW = 0.92
+
+    def __call__(self) -> Optional[SimpleCandidate]:
+        instance = self.instance
+        offsets = instance.lib_offsets
+        sorted_books = instance.books_by_score
+        scores = instance.book_scores
+        signup = instance.library_signup_time
+        efficiency = instance.library_efficiency
+        dedup = instance.scorer.has_duplicates
+        used = np.zeros(instance.B, dtype=bool)
+
+        time_left = instance.D
+        step = 0
+        # step when the library was evaluated / when its books were used
+        evaluated_at = np.zeros(instance.L, dtype=np.int64)
+        touched_at = np.full(instance.L, -1, dtype=np.int64)
+        # number of its unused books, if all of them fitted at that time
+        fits_all = np.full(instance.L, -1, dtype=np.int64)
+
+        def evaluate(lib: int) -> float:
+            T = signup[lib]
+            books = sorted_books[offsets[lib]:offsets[lib + 1]]
+            books = books[~used[books]]
+            if dedup:
+                books = instance.scorer.distinct(books)
+            books_to_scan = (time_left - T) * efficiency[lib]
+            evaluated_at[lib] = step
+            fits_all[lib] = len(books) if books_to_scan >= len(books) else -1
+            return int(scores[books[:books_to_scan]].sum()) / (T ** self.POW)
+
+        heap = [(-evaluate(lib), lib) for lib in range(instance.L)
+                if signup[lib] <= time_left]
+        heapq.heapify(heap)
+
+        library_signups = []
+        signed_up = np.zeros(instance.L, dtype=bool)
+        while time_left > 0 and heap:
+            neg_score, lib = heapq.heappop(heap)
+            if signup[lib] > time_left:
+                continue  # it will never fit again
+            fresh = evaluated_at[lib] == step or (
+                touched_at[lib] < evaluated_at[lib]
+                and 0 <= fits_all[lib]
+                <= (time_left - signup[lib]) * efficiency[lib])
+            if not fresh:
+                heapq.heappush(heap, (-evaluate(lib), lib))
+                continue
+            if neg_score >= 0:
+                break  # nothing more to gain
+
+            library_signups.append(lib)
+            signed_up[lib] = True
+            books = instance.lib_books[offsets[lib]:offsets[lib + 1]]
+            books = books[~used[books]]
+            used[books] = True
+            touched_at[instance.libraries_of(books)] = step
+            time_left -= signup[lib]
+            step += 1
+            if our_timer.get_cpu_time_left() <= 30:
+                return None  # 30 seconds left, start panicking
+
+        library_signups.extend(np.flatnonzero(~signed_up).tolist())
+        return SimpleCandidate.new_without_copy(
+            instance,
+            library_signups,
+            BookOrders(instance.library_book_ids))
+
+
 class GreedyFast(GreedyBase):
-    def __init__(self, instance: Problem):
+    # exponent of the sign-up time in the library score
+    POW = 1.0
+    # exponents tried by `sweep`
+    POWS = np.round(np.linspace(0.5, 1.5, 21), 2)
+
+    def __init__(self, instance: Problem, POW: Optional[float] = None):
         super().__init__(instance)
         self.instance = instance
-        self.POW = 1.0
+        if POW is not None:
+            self.POW = POW
+
+    def score_libs(self, POW=1.15) -> np.ndarray:
+        """
+        Score of the best books each library can scan, over T_j ** POW
 
-    def score_lib(self, idx, POW=1.15):
-        time_to_use = self.instance.D - self.instance.library_signup_time[idx]
-        books_to_scan = time_to_use * self.instance.library_efficiency[idx]
-        return sum(self.instance.book_scores[b] for b in self.instance.library_book_ids[idx][:books_to_scan])/((self.instance.library_signup_time[idx])**POW)
+        With an array of exponents, one row of scores per exponent.
+        """
+        instance = self.instance
+        best = instance.best_books_score(instance.initial_capacity)
+        POW = np.asarray(POW, dtype=np.float64)[..., None]
+        return best / instance.signup_time ** POW
 
     def __call__(self) -> SimpleCandidate:
-        libraries = list(range(self.instance.L))
-        libraries.sort(key=lambda x: self.score_lib(x, self.POW), reverse=True)
-        output = []
-        for lib in libraries:
-            output.append(lib)
-        return SimpleCandidate(self.instance,
-                               output, self.instance.library_book_ids)
+        scores = self.score_libs(self.POW)
+        libraries = np.argsort(-scores, kind='stable')
+        return SimpleCandidate.new_without_copy(
+            self.instance,
+            libraries.tolist(),
+            BookOrders(self.instance.library_book_ids))
+
+    def sweep(self, pows=None) -> list[tuple[float, int, SimpleCandidate]]:
+        """
+        Orderings for a grid of exponents, all sorted at once.
+
+        Returns (exponent, score, candidate) with the best score first.
+        Books are in descending score order.
+        """
+        instance = self.instance
+        pows = self.POWS if pows is None else np.asarray(pows)
+        orders = np.argsort(-self.score_libs(pows), axis=1, kind='stable')
+        books = LibraryBooksView(instance.lib_offsets, instance.books_by_score)
+        out = []
+        seen: dict[bytes, int] = {}
+        for POW, order in zip(pows.tolist(), orders):
+            # neighbouring exponents often give the same order
+            key = order.tobytes()
+            if key not in seen:
+                seen[key] = instance.scorer.score_candidate(order, books)
+            out.append((POW, seen[key], SimpleCandidate.new_without_copy(
+                instance, order.tolist(), BookOrders(books))))
+        out.sort(key=lambda x: -x[1])
+        return out
 
 # list of all greedy algorithms in this module
 
@@ -383,11 +567,40 @@ ALL_LIBR_BOOK_PAIRS = list(enumerate_two_sorter_combinations())
 # pprint([ x.get_strategy_name() for x in ALL_LIBR_BOOK_PAIRS] )
 
 
+def run_sorters(instance: Problem,
+                sorters: list[type[GreedyBase]]) -> list[SimpleCandidate]:
+    """
+    Run sorting heuristics (e.g. ALL_LIBR_BOOK_PAIRS) at once.
+
+    Every distinct library order and book order is computed
+    only once and shared by the candidates (copy-on-write).
+    """
+    library_orders: dict[tuple, list[int]] = {}
+    book_orders: dict[tuple, LibraryBooksView] = {}
+    out = []
+    for sorter_type in sorters:
+        sorter = sorter_type(instance)
+        # the same key method and direction give the same order
+        lk = (sorter_type.libr_keys, sorter.libr_asc)
+        if lk not in library_orders:
+            library_orders[lk] = sorter.library_order().tolist()
+        bk = (sorter_type.book_keys, sorter.book_asc)
+        if bk not in book_orders:
+            book_orders[bk] = sorter.book_order()
+        out.append(SimpleCandidate.new_without_copy(
+            instance,
+            list(library_orders[lk]),
+            BookOrders(book_orders[bk])))
+    return out
+
+
 # heuristics which combine knowledge
 # about libraries and books inside them
 ALL_COMBINED_GREEDY: list[type[GreedyBase]] = [
     GreedyChooseLibrary,
+    GreedyChooseLibraryLazy,
     GreedyDynamic,
+    GreedyDynamicLazy,
 ]
 
 ALL_GREEDY_STRATEGIES: list[type[GreedyBase]] = [
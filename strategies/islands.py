@@ -0,0 +1,165 @@
+import multiprocessing as mp
+import queue
+from sys import stderr
+from typing import Any, Optional
+
+import numpy as np
+
+import our_timer
+from portfolio import pack
+from .genetic import Candidate, Genetic
+from .strategies import (BookOrders, Problem, SimpleCandidate, Strategy,
+                         Submission)
+
+
+class Island(Genetic):
+    """
+    Genetic algorithm running in its own process,
+    connected to the next island in a ring.
+    """
+
+    def __init__(self, instance: Problem, index: int,
+                 inbox: Any, outbox: Any,
+                 migration_interval: int, migrants: int, **kwargs):
+        super().__init__(instance, **kwargs)
+        self.index = index
+        self.inbox = inbox
+        self.outbox = outbox
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+
+    def migrate(self, generation: int, population: list[Candidate]):
+        if generation == 0 or generation % self.migration_interval != 0:
+            return
+        # send copies of our elites to the next island
+        for c in population[:self.migrants]:
+            self.outbox.put(pack(c))
+        # replace the worst candidates with whatever has arrived
+        arrived = []
+        while len(arrived) < len(population) - self.elitism_no:
+            try:
+                libraries, own = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            arrived.append(_unpack(self.instance, libraries, own))
+        if arrived:
+            print(f'Island {self.index}: {len(arrived)} migrants arrived',
+                  file=stderr)
+            population[len(population) - len(arrived):] = arrived
+
+
+def _unpack(instance: Problem, libraries: np.ndarray,
+            own: dict[int, list[int]]) -> Candidate:
+    """Candidate sent by `portfolio.pack`"""
+    return Candidate(instance, libraries,
+                     BookOrders(instance.library_book_ids, own))
+
+
+def _run_island(instance: Problem, index: int,
+                initial: list[SimpleCandidate],
+                inbox: Any, outbox: Any, results: Any,
+                cpu_time_left_ns: int, seed: Optional[int],
+                kwargs: dict):
+    start = our_timer.process_time_ns()
+    # start with this island's share of the parent's budget
+    our_timer.reset_countdown_timer()
+    our_timer.charge_cpu_time_ns(our_timer.get_cpu_time_left_ns()
+                                 - cpu_time_left_ns)
+    solver = Island(instance, index, inbox, outbox, seed=seed, **kwargs)
+    solver.sub_to_cand(initial)
+    population = solver.initial_population()
+    if solver.workers > 1:
+        solver.start_workers(population)
+    try:
+        best = solver.evolve(population)
+    finally:
+        if solver._pool is not None:
+            solver._pool.terminate()
+    results.put((best.fitness(), pack(best),
+                 our_timer.process_time_ns() - start))
+
+
+class IslandGenetic(Strategy):
+    """
+    Island model: `islands` Genetic populations evolve in separate
+    processes, each seeded from a different subset of the greedy
+    solutions. Every `migration_interval` generations each island
+    sends its `migrants` best candidates to the next one (ring).
+    """
+
+    def __init__(self, instance: Problem, islands: int = 4,
+                 migration_interval: int = 5, migrants: int = 2,
+                 seed: Optional[int] = None, **kwargs):
+        super().__init__(instance)
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.seed = seed
+        # passed to every Island (Genetic parameters)
+        self.kwargs = kwargs
+        self.initial: list[SimpleCandidate] = []
+
+    def sub_to_cand(self, sub_list: list[SimpleCandidate]):
+        self.initial.extend(sub_list)
+
+    def __call__(self) -> Submission:
+        n = self.islands
+        if 'fork' in mp.get_all_start_methods():
+            ctx = mp.get_context('fork')
+        else:
+            ctx = mp.get_context()
+        queues = [ctx.Queue() for _ in range(n)]
+        results = ctx.Queue()
+        # the islands' CPU time is charged to us, so they share the budget
+        # (each of them stops with Genetic.CPU_RESERVE left)
+        reserve_ns = int(Genetic.CPU_RESERVE * 1e9)
+        cpu_time_left_ns = reserve_ns + max(
+            our_timer.get_cpu_time_left_ns() - reserve_ns, 0) // n
+        processes = []
+        for i in range(n):
+            seed = None if self.seed is None else self.seed + i
+            p = ctx.Process(target=_run_island,
+                            args=(self.instance, i, self.initial[i::n],
+                                  queues[i], queues[(i + 1) % n], results,
+                                  cpu_time_left_ns, seed,
+                                  dict(migration_interval=self.migration_interval,
+                                       migrants=self.migrants,
+                                       **self.kwargs)))
+            p.start()
+            processes.append(p)
+
+        best = None
+        received = failed = 0
+        while received + failed < n:
+            try:
+                score, packed, cpu_ns = results.get(timeout=1.0)
+            except queue.Empty:
+                # islands which exited without sending a result
+                failed = sum(p.exitcode not in (None, 0) for p in processes)
+                if not any(p.is_alive() for p in processes):
+                    break
+                continue
+            received += 1
+            # count the islands' CPU time against our budget
+            our_timer.charge_cpu_time_ns(cpu_ns)
+            if best is None or score > best[0]:
+                best = (score, packed)
+        if failed:
+            print(f'{failed} of {n} islands failed', file=stderr)
+        # Islands exit only after their migrants have been read,
+        # collect whatever was sent to islands which already stopped.
+        while any(p.is_alive() for p in processes):
+            for q in queues:
+                try:
+                    while True:
+                        q.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+        for p in processes:
+            p.join()
+        if best is None:
+            # no island finished, fall back to the best initial candidate
+            return max((c.to_submission() for c in self.initial),
+                       key=lambda x: x.get_submission_score())
+        print(f'Best of {n} islands: {best[0]}', file=stderr)
+        return _unpack(self.instance, *best[1]).to_submission()
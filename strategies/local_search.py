@@ -0,0 +1,104 @@
+import random
+from sys import stderr
+from typing import Optional
+
+import numpy as np
+
+import our_timer
+from scoring import IncrementalScore
+from .strategies import Problem, SimpleCandidate, Strategy
+
+
+class LocalSearch(Strategy):
+    """
+    Hill climbing on the signup order of a candidate.
+
+    Moves:
+    - swap two libraries which sign up before the deadline,
+    - insert (move) such a library at another position,
+    - replace one of the last `window` libraries which sign up
+      before the deadline with one which does not sign up in time
+      (only libraries after the replaced one are evaluated again).
+
+    Every move is scored incrementally (`scoring.IncrementalScore`),
+    only libraries whose start day changes are evaluated again.
+    Moves which make the score worse are undone. The search stops
+    after `time_limit` CPU seconds or `patience` moves in a row
+    without an improvement.
+    """
+
+    def __init__(self, instance: Problem, candidate: SimpleCandidate,
+                 time_limit: float = 10.0, window: int = 50,
+                 patience: int = 3000, seed: Optional[int] = None):
+        super().__init__(instance)
+        self.candidate = candidate
+        # CPU seconds for this search
+        self.time_limit = time_limit
+        # maximal distance between positions of swap and insert moves
+        self.window = window
+        # moves without an improvement before giving up
+        self.patience = patience
+        self.random = random.Random(seed)
+
+    def __call__(self) -> SimpleCandidate:
+        L = self.instance.L
+        order = list(self.candidate.libraries)
+        # libraries missing from the order can still be swapped in
+        missing = np.setdiff1d(np.arange(L), np.asarray(order, dtype=np.int64))
+        order.extend(missing.tolist())
+
+        state = IncrementalScore(self.instance, order,
+                                 self.candidate.books_in_library)
+        start_score = state.score
+        rnd = self.random
+        tried = {'swap': 0, 'insert': 0, 'replace': 0}
+        accepted = dict.fromkeys(tried, 0)
+        deadline = our_timer.process_time_ns() + int(self.time_limit * 1e9)
+
+        moves = 0
+        last_improvement = 0
+        while moves - last_improvement <= self.patience:
+            moves += 1
+            if moves % 100 == 0:
+                if our_timer.process_time_ns() > deadline:
+                    break
+                if our_timer.get_cpu_time_left() <= 30:
+                    break  # 30 seconds left, start panicking
+            active = state.active_count()
+            if active == 0:
+                break
+            old = state.score
+            kind = rnd.choice(('swap', 'insert', 'replace'))
+            if kind == 'replace':
+                if active == len(state.order):
+                    continue
+                i = rnd.randrange(max(0, active - self.window), active)
+                j = rnd.randrange(active, len(state.order))
+                state.swap(i, j)
+            else:
+                i = rnd.randrange(active)
+                j = rnd.randrange(max(0, i - self.window),
+                                  min(active, i + self.window + 1))
+                if i == j:
+                    continue
+                if kind == 'swap':
+                    state.swap(i, j)
+                else:
+                    state.move(i, j)
+            tried[kind] += 1
+
+            if state.score > old:
+                accepted[kind] += 1
+                last_improvement = moves
+            elif kind == 'insert':
+                state.move(j, i)
+            else:
+                state.swap(i, j)
+            assert state.score >= old
+
+        print(f'local search: {start_score:_} -> {state.score:_}, '
+              f'accepted {accepted} of {tried}', file=stderr)
+        return SimpleCandidate.new_without_copy(
+            self.instance,
+            state.order.tolist(),
+            self.candidate.books_in_library)
@@ -1,5 +1,11 @@
+from sys import stdout
+from typing import Optional, Sequence
+
+import numpy as np
+
+import profiler
 from loader import Problem
-from submission import Submission
+from submission import Submission, write_schedule
 
 
 class Strategy(object):
@@ -15,6 +21,39 @@ class Strategy(object):
         return cls.__name__
 
 
+class BookOrders:
+    """
+    Order of books in every library, shared copy-on-write.
+
+    Lists in `base` are never modified, a library gets its own list
+    only when it is assigned (`orders[j] = books`). Copying costs
+    O(number of libraries with their own order).
+    """
+    __slots__ = ('base', 'own')
+
+    def __init__(self, base: Sequence[list[int]],
+                 own: Optional[dict[int, list[int]]] = None):
+        self.base = base
+        self.own = own if own is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def __getitem__(self, j: int) -> list[int]:
+        books = self.own.get(j)
+        return books if books is not None else self.base[j]
+
+    def __setitem__(self, j: int, books: list[int]):
+        self.own[int(j)] = books
+
+    def __iter__(self):
+        for j in range(len(self.base)):
+            yield self[j]
+
+    def copy(self) -> 'BookOrders':
+        return BookOrders(self.base, dict(self.own))
+
+
 class SimpleCandidate:
     def __init__(self, instance: Problem, libraries: list[int], books_in_library: list[list[int]]):
         self.instance = instance
@@ -31,24 +70,46 @@ class SimpleCandidate:
         return s
 
     def to_submission(self) -> Submission:
-        time_to_alloc = self.instance.D
-        libs = []
-        books = []
-        for library in self.libraries:
-            time_to_alloc -= self.instance.library_signup_time[library]
-            if time_to_alloc <= 0:
-                break
-            libs.append(library)
-            books.append(self.books_in_library[library][:(
-                time_to_alloc * self.instance.library_efficiency[library]
-            )])
-        return Submission(self.instance, libs, books)
+        with profiler.span('to_submission'):
+            return Submission.from_candidate(self.instance, self.libraries,
+                                             self.books_in_library)
+
+    def write(self, file=stdout):
+        """Write the schedule without building a Submission first"""
+        libs, capacity = self.instance.scorer.schedule(self.libraries)
+        write_schedule(
+            libs.tolist(),
+            (self.books_in_library[Y][:c]
+             for Y, c in zip(libs.tolist(), capacity.tolist())),
+            file=file)
 
     def books_improver(self):
-        scanned_books = set()
-        for library in self.libraries:
-            self.books_in_library[library].sort(
-                key=lambda x: self.instance.book_scores[x]
-                if x not in scanned_books else 0,
-                reverse=True)
-            scanned_books.update(self.books_in_library[library])
+        """
+        Assign books to libraries in sign-up order.
+
+        Every library which signs up in time sorts its books by score
+        (stably, ties keep their order), books taken by earlier libraries
+        last. Its first books up to its capacity `(D - start day) * M`
+        are marked as taken. Other libraries keep their order.
+        """
+        with profiler.span('books_improver'):
+            instance = self.instance
+            scores = instance.book_scores
+            taken = np.zeros(instance.B, dtype=bool)
+            own = {}
+            libs, capacity = instance.scorer.schedule(self.libraries)
+            for Y, c in zip(libs.tolist(), capacity.tolist()):
+                books = np.asarray(self.books_in_library[Y], dtype=np.int64)
+                key = np.where(taken[books], -1, scores[books])
+                books = books[np.argsort(-key, kind='stable')]
+                taken[books[:c]] = True
+                own[Y] = books.tolist()
+            # a new object, the old one may be shared with other candidates
+            orders = self.books_in_library
+            if isinstance(orders, BookOrders):
+                self.books_in_library = BookOrders(orders.base,
+                                                   {**orders.own, **own})
+            else:
+                self.books_in_library = list(orders)
+                for Y, books in own.items():
+                    self.books_in_library[Y] = books
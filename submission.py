@@ -1,65 +1,138 @@
-from dataclasses import dataclass
+from itertools import chain
 from sys import stdout
+from typing import Iterable, Optional, Sequence
 
-from loader import Problem
+import numpy as np
+
+from loader import LibraryBooksView, Problem
 
 
-@dataclass(frozen=True)  # TODO: make tuples from lists
 class Submission:
-    instance: Problem
+    """
+    Libraries to sign up and the books they scan, in sign-up order.
+
+    Books are stored in CSR arrays: the i-th library scans
+    `books[offsets[i]:offsets[i + 1]]` (`books_to_scan[i]`).
+
+    A submission made by `from_candidate` only keeps a reference
+    to the candidate's book orders (a shallow copy of the container,
+    book lists are shared) and builds the arrays on first access
+    to `books_to_scan`. Scoring and writing do not need them.
+    """
+    __slots__ = ('instance', 'library_signups', '_books', '_offsets',
+                 '_source', '_capacity', '_score')
+
+    def __init__(self, instance: Problem, library_signups: Sequence[int],
+                 books_to_scan: Sequence[Sequence[int]]):
+        self.instance = instance
+        # order of libraries to sign up
+        self.library_signups = np.asarray(library_signups, dtype=np.int64)
+        self._offsets = np.zeros(len(books_to_scan) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in books_to_scan], out=self._offsets[1:])
+        self._books = np.fromiter(chain.from_iterable(books_to_scan),
+                                  dtype=np.int64, count=int(self._offsets[-1]))
+        self._source = None
+        self._capacity = None
+        self._score: Optional[int] = None
 
-    # order of libraries to sign up
-    library_signups: list[int]
+    @classmethod
+    def from_candidate(cls, instance: Problem, libraries: Sequence[int],
+                       books_in_library: Sequence[Sequence[int]]) -> 'Submission':
+        """Libraries which sign up in time, books ordered per library ID"""
+        s = cls.__new__(cls)
+        s.instance = instance
+        s.library_signups, s._capacity = instance.scorer.schedule(libraries)
+        # rows are only ever replaced, not modified in place
+        copy = getattr(books_in_library, 'copy', None)
+        s._source = copy() if copy is not None else books_in_library
+        s._books = None
+        s._offsets = None
+        s._score = None
+        return s
 
-    # map i-th library (in order) -> list of book IDs
-    books_to_scan: list[list[int]]
-    # books_to_scan: dict[int, list[int]]
+    def _rows(self) -> Iterable[Sequence[int]]:
+        """Scanned books of every library (without building the arrays)"""
+        if self._books is not None:
+            offsets, books = self._offsets, self._books
+            return (books[offsets[i]:offsets[i + 1]]
+                    for i in range(len(offsets) - 1))
+        return (self._source[Y][:c]
+                for Y, c in zip(self.library_signups.tolist(),
+                                self._capacity.tolist()))
+
+    @property
+    def books_to_scan(self) -> LibraryBooksView:
+        """Map i-th library (in order) -> list of book IDs"""
+        if self._books is None:
+            rows = list(self._rows())
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum([len(x) for x in rows], out=offsets[1:])
+            self._books = np.fromiter(chain.from_iterable(rows),
+                                      dtype=np.int64, count=int(offsets[-1]))
+            self._offsets = offsets
+            self._source = self._capacity = None
+        return LibraryBooksView(self._offsets, self._books)
 
     def write(self, file=stdout):
-        print(len(self.library_signups), file=file)
-        for i, j in enumerate(self.library_signups):
-            print(f'{j} {len(self.books_to_scan[i])}', file=file)
-            print(*self.books_to_scan[i], sep=' ', file=file)
+        write_schedule(self.library_signups.tolist(), self._rows(), file=file)
+
+    def validate(self):
+        """
+        Check that this is a valid submission (raises AssertionError).
+        """
+        self.instance.scorer.validate(self.library_signups,
+                                      self.books_to_scan)
 
-    def get_submission_score(self) -> int:
+    def get_submission_score(self, validate: bool = False) -> int:
         """
         Compute the final score for this submission.
+
+        Sanity checks are skipped unless `validate` is set.
         """
-        B, L, D = self.instance.B, self.instance.L, self.instance.D
-
-        A = len(self.library_signups)
-        assert 0 <= A <= L
-        assert (len(set(self.library_signups))
-                == len(self.library_signups))
-
-        final_score = 0
-        book_visited = set()
-        signup_days = 0
-        for i, Y in enumerate(self.library_signups):
-            # Y - library ID, index in problem instance
-            # i - index in `self`
-            assert 0 <= Y < L
-            signup_days += self.instance.library_signup_time[Y]
-            if signup_days > D:
-                break  # past deadline
-
-            # NOTE: these assertions below can be safely commented out,
-            #       they are there just as a sanity check.
-            # we want to scan something
-            assert len(self.books_to_scan[i]) > 0
-            # check library idx - subset
-            assert set(self.books_to_scan[i]) <= set(
-                set(self.instance.library_book_ids[Y]))
-
-            capacity = (self.instance.library_efficiency[Y]
-                        * (D - signup_days))
-            if capacity <= 0:
-                continue
-            for k in self.books_to_scan[i][:capacity]:
-                assert 0 <= k < B  # book ID
-                if k in book_visited:
-                    continue
-                book_visited.add(k)
-                final_score += self.instance.book_scores[k]
-
-        return final_score
+        if validate:
+            self.validate()
+        if self._score is None:
+            scorer = self.instance.scorer
+            if self._books is None:
+                # the sign-ups are already cut at the deadline
+                self._score = scorer.score_candidate(self.library_signups,
+                                                     self._source)
+            else:
+                self._score = scorer.score_flat(self.library_signups,
+                                                self._offsets, self._books)
+        return self._score
+
+
+def write_schedule(library_signups: Sequence[int],
+                   books_to_scan: Iterable[Sequence[int]],
+                   file=stdout, chunk_lines: int = 4096):
+    """
+    Write a schedule in the output format.
+
+    Lines are joined into large chunks, which are written
+    as bytes to the underlying binary buffer of `file` (if it has one).
+    """
+    raw = getattr(file, 'buffer', None)
+    if raw is not None:
+        file.flush()  # keep the order of earlier text writes
+
+    def emit(lines: list[str]):
+        data = '\n'.join(lines) + '\n'
+        if raw is not None:
+            raw.write(data.encode('ascii'))
+        else:
+            file.write(data)
+
+    lines = [str(len(library_signups))]
+    for j, books in zip(library_signups, books_to_scan):
+        if isinstance(books, np.ndarray):
+            books = books.tolist()
+        lines.append(f'{j} {len(books)}')
+        lines.append(' '.join(map(str, books)))
+        if len(lines) >= chunk_lines:
+            emit(lines)
+            lines = []
+    if lines:
+        emit(lines)
+    if raw is not None:
+        raw.flush()